@@ -0,0 +1,48 @@
+"""indexes for scheduler, dashboard and login query shapes
+
+Revision ID: 3b9f6c2e8d15
+Revises: e84d1f0a6b27
+Create Date: 2026-10-18 14:21:48.902377
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9f6c2e8d15'
+down_revision: Union[str, None] = 'e84d1f0a6b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Child rows of one process by status (progress, retries)
+    op.create_index('ix_post_process_id_status', 'post', ['process_id', 'status'], unique=False)
+    op.create_index('ix_comment_process_id_status', 'comment', ['process_id', 'status'], unique=False)
+    op.create_index('ix_reaction_process_id_status', 'reaction', ['process_id', 'status'], unique=False)
+    # Per-user comment / reaction counts on the users page
+    op.create_index('ix_comment_user_id_status', 'comment', ['user_id', 'status'], unique=False)
+    op.create_index('ix_reaction_user_id_status', 'reaction', ['user_id', 'status'], unique=False)
+    # Facebook login lookup
+    op.create_index('ix_user_fb_id', 'user', ['fb_id'], unique=False)
+    # selectinload of User.groups / User.pages, and medias per process when publishing
+    op.create_index('ix_group_admin_id', 'group', ['admin_id'], unique=False)
+    op.create_index('ix_page_admin_id', 'page', ['admin_id'], unique=False)
+    op.create_index('ix_media_process_id', 'media', ['process_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_media_process_id', table_name='media')
+    op.drop_index('ix_page_admin_id', table_name='page')
+    op.drop_index('ix_group_admin_id', table_name='group')
+    op.drop_index('ix_user_fb_id', table_name='user')
+    op.drop_index('ix_reaction_user_id_status', table_name='reaction')
+    op.drop_index('ix_comment_user_id_status', table_name='comment')
+    op.drop_index('ix_reaction_process_id_status', table_name='reaction')
+    op.drop_index('ix_comment_process_id_status', table_name='comment')
+    op.drop_index('ix_post_process_id_status', table_name='post')
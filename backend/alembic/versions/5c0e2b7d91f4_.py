@@ -0,0 +1,56 @@
+"""keyset pagination indexes
+
+Revision ID: 5c0e2b7d91f4
+Revises: a31604e030c2
+Create Date: 2026-10-18 11:02:17.540913
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c0e2b7d91f4'
+down_revision: Union[str, None] = 'a31604e030c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_post_created_at_id', 'post', ['created_at', 'id'], unique=False)
+    op.create_index('ix_post_status_created_at', 'post', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_post_process_id_created_at', 'post', ['process_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_comment_created_at_id', 'comment', ['created_at', 'id'], unique=False)
+    op.create_index('ix_comment_status_created_at', 'comment', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_comment_process_id_created_at', 'comment', ['process_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_reaction_created_at_id', 'reaction', ['created_at', 'id'], unique=False)
+    op.create_index('ix_reaction_status_created_at', 'reaction', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_reaction_process_id_created_at', 'reaction', ['process_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_postprocess_created_at_id', 'postprocess', ['created_at', 'id'], unique=False)
+    op.create_index('ix_postprocess_status_created_at', 'postprocess', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_commentprocess_created_at_id', 'commentprocess', ['created_at', 'id'], unique=False)
+    op.create_index('ix_commentprocess_status_created_at', 'commentprocess', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_reactionprocess_created_at_id', 'reactionprocess', ['created_at', 'id'], unique=False)
+    op.create_index('ix_reactionprocess_status_created_at', 'reactionprocess', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reactionprocess_created_at_id', table_name='reactionprocess')
+    op.drop_index('ix_reactionprocess_status_created_at', table_name='reactionprocess')
+    op.drop_index('ix_commentprocess_created_at_id', table_name='commentprocess')
+    op.drop_index('ix_commentprocess_status_created_at', table_name='commentprocess')
+    op.drop_index('ix_postprocess_created_at_id', table_name='postprocess')
+    op.drop_index('ix_postprocess_status_created_at', table_name='postprocess')
+    op.drop_index('ix_reaction_created_at_id', table_name='reaction')
+    op.drop_index('ix_reaction_status_created_at', table_name='reaction')
+    op.drop_index('ix_reaction_process_id_created_at', table_name='reaction')
+    op.drop_index('ix_comment_created_at_id', table_name='comment')
+    op.drop_index('ix_comment_status_created_at', table_name='comment')
+    op.drop_index('ix_comment_process_id_created_at', table_name='comment')
+    op.drop_index('ix_post_created_at_id', table_name='post')
+    op.drop_index('ix_post_status_created_at', table_name='post')
+    op.drop_index('ix_post_process_id_created_at', table_name='post')
@@ -0,0 +1,43 @@
+"""media processing metadata
+
+Revision ID: 6a1f3d8e2b47
+Revises: 9d27e4c1a8b3
+Create Date: 2026-10-18 16:02:41.193258
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a1f3d8e2b47'
+down_revision: Union[str, None] = '9d27e4c1a8b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('media', sa.Column('preview_url', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('media', sa.Column('publish_url', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('media', sa.Column('mime_type', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.add_column('media', sa.Column('file_size', sa.Integer(), nullable=True))
+    op.add_column('media', sa.Column('width', sa.Integer(), nullable=True))
+    op.add_column('media', sa.Column('height', sa.Integer(), nullable=True))
+    op.add_column('media', sa.Column('duration', sa.Float(), nullable=True))
+    op.add_column('media', sa.Column('codec', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('media') as batch_op:
+        batch_op.drop_column('codec')
+        batch_op.drop_column('duration')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
+        batch_op.drop_column('file_size')
+        batch_op.drop_column('mime_type')
+        batch_op.drop_column('publish_url')
+        batch_op.drop_column('preview_url')
@@ -0,0 +1,31 @@
+"""media content hash
+
+Revision ID: 9d27e4c1a8b3
+Revises: 3b9f6c2e8d15
+Create Date: 2026-10-18 15:36:12.447091
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d27e4c1a8b3'
+down_revision: Union[str, None] = '3b9f6c2e8d15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('media', sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    op.create_index('ix_media_content_hash', 'media', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_media_content_hash', table_name='media')
+    with op.batch_alter_table('media') as batch_op:
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,32 @@
+"""status/scheduled_for indexes for the scheduler
+
+Revision ID: a31604e030c2
+Revises: afb7b7310133
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a31604e030c2'
+down_revision: Union[str, None] = 'afb7b7310133'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_post_status_scheduled_for', 'post', ['status', 'scheduled_for'], unique=False)
+    op.create_index('ix_comment_status_scheduled_for', 'comment', ['status', 'scheduled_for'], unique=False)
+    op.create_index('ix_reaction_status_scheduled_for', 'reaction', ['status', 'scheduled_for'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reaction_status_scheduled_for', table_name='reaction')
+    op.drop_index('ix_comment_status_scheduled_for', table_name='comment')
+    op.drop_index('ix_post_status_scheduled_for', table_name='post')
@@ -0,0 +1,37 @@
+"""scheduler claimed_at
+
+Revision ID: c52e7a9f1d30
+Revises: 6a1f3d8e2b47
+Create Date: 2026-10-18 18:21:07.558214
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52e7a9f1d30'
+down_revision: Union[str, None] = '6a1f3d8e2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('post', 'comment', 'reaction'):
+        op.add_column(table, sa.Column('claimed_at', sa.DateTime(), nullable=True))
+        # Rows already Running get a claim time so the scheduler can
+        # requeue them if nothing finishes them
+        op.execute(
+            sa.text(f"UPDATE {table} SET claimed_at = :now WHERE status = 'running'").bindparams(now=datetime.utcnow())
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ('reaction', 'comment', 'post'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('claimed_at')
@@ -0,0 +1,53 @@
+"""process progress counters
+
+Revision ID: e84d1f0a6b27
+Revises: 5c0e2b7d91f4
+Create Date: 2026-10-18 12:40:05.118620
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e84d1f0a6b27'
+down_revision: Union[str, None] = '5c0e2b7d91f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('postprocess', sa.Column('total_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('postprocess', sa.Column('queued_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('postprocess', sa.Column('published_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('postprocess', sa.Column('error_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commentprocess', sa.Column('total_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commentprocess', sa.Column('queued_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commentprocess', sa.Column('published_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('commentprocess', sa.Column('error_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('reactionprocess', sa.Column('total_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('reactionprocess', sa.Column('queued_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('reactionprocess', sa.Column('published_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('reactionprocess', sa.Column('error_count', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('reactionprocess') as batch_op:
+        batch_op.drop_column('error_count')
+        batch_op.drop_column('published_count')
+        batch_op.drop_column('queued_count')
+        batch_op.drop_column('total_count')
+    with op.batch_alter_table('commentprocess') as batch_op:
+        batch_op.drop_column('error_count')
+        batch_op.drop_column('published_count')
+        batch_op.drop_column('queued_count')
+        batch_op.drop_column('total_count')
+    with op.batch_alter_table('postprocess') as batch_op:
+        batch_op.drop_column('error_count')
+        batch_op.drop_column('published_count')
+        batch_op.drop_column('queued_count')
+        batch_op.drop_column('total_count')
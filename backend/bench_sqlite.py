@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Mirrors set_sqlite_pragmas in db.py
+TUNED_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+]
+DEFAULT_PRAGMAS = []
+
+DURATION = 5
+WRITERS = 4
+READERS = 8
+ROWS = 10_000
+
+def connect(path, pragmas):
+    conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+def setup(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE post (id INTEGER PRIMARY KEY, status TEXT, text TEXT)")
+    conn.executemany("INSERT INTO post (status, text) VALUES ('queued', ?)", [(f"post {i}",) for i in range(ROWS)])
+    conn.commit()
+    conn.close()
+
+def run(pragmas):
+    """Writers flip post statuses one commit at a time (like the workers),
+    readers page through posts (like the dashboard)."""
+    with tempfile.TemporaryDirectory() as directory:
+        return _run(os.path.join(directory, "bench.db"), pragmas)
+
+def _run(path, pragmas):
+    setup(path)
+    stop = time.monotonic() + DURATION
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def writer(n):
+        conn = connect(path, pragmas)
+        i = n
+        while time.monotonic() < stop:
+            try:
+                conn.execute("UPDATE post SET status = 'published' WHERE id = ?", (i % ROWS + 1,))
+                conn.commit()
+                with lock:
+                    counts["writes"] += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                with lock:
+                    counts["locked"] += 1
+            i += WRITERS
+        conn.close()
+
+    def reader(n):
+        conn = connect(path, pragmas)
+        while time.monotonic() < stop:
+            try:
+                conn.execute("SELECT id, status, text FROM post ORDER BY id DESC LIMIT 50 OFFSET ?", ((n * 50) % ROWS,)).fetchall()
+                with lock:
+                    counts["reads"] += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    counts["locked"] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {key: round(value / DURATION) for key, value in counts.items()}
+
+# Run this with:
+# python backend/bench_sqlite.py
+if __name__ == "__main__":
+    for name, pragmas in (("default", DEFAULT_PRAGMAS), ("tuned", TUNED_PRAGMAS)):
+        result = run(pragmas)
+        print(f"{name:8} reads/s={result['reads']:>7} writes/s={result['writes']:>6} locked errors/s={result['locked']}")
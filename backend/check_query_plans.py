@@ -0,0 +1,70 @@
+import re
+import sys
+from datetime import datetime
+from sqlalchemy import create_engine, select, or_, func
+from sqlmodel import SQLModel
+from backend.models import Post, Comment, Reaction, User, Media, PostProcess, CommentProcess, ReactionProcess, Status
+from backend.pagination import paginate, filter_rows, encode_cursor
+
+# A plan line like "SCAN post" (no index) or a temp sort means the query
+# touches every row; either one fails the check
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR ORDER BY")
+
+def hot_queries():
+    """The query shapes behind the scheduler, list endpoints, counters and login."""
+    now = datetime.utcnow()
+    cursor = encode_cursor(now, 100)
+    queries = {}
+
+    for model in (Post, Comment, Reaction):
+        name = model.__tablename__
+        # scheduler.claim_due
+        queries[f"{name}: due rows"] = (
+            select(model.id)
+            .where(model.status == Status.queued, or_(model.scheduled_for == None, model.scheduled_for <= now))
+            .order_by(model.scheduled_for)
+            .limit(500)
+        )
+        queries[f"{name}: list page"] = paginate(select(model), model, 10, cursor)
+        queries[f"{name}: list by status"] = paginate(filter_rows(select(model), model, status=Status.published), model, 10, cursor)
+        queries[f"{name}: list by process"] = paginate(filter_rows(select(model), model, process_id=1), model, 10, cursor)
+        queries[f"{name}: process children by status"] = (
+            select(func.count(model.id)).where(model.process_id == 1, model.status == Status.error)
+        )
+
+    for model in (PostProcess, CommentProcess, ReactionProcess):
+        queries[f"{model.__tablename__}: list page"] = paginate(select(model), model, 10, cursor)
+
+    for model in (Comment, Reaction):
+        queries[f"{model.__tablename__}: count per user"] = (
+            select(model.user_id, func.count(model.id)).group_by(model.user_id)
+        )
+
+    queries["user: login lookup"] = select(User).where(User.fb_id == "1")
+    queries["media: medias of processes"] = select(Media).where(Media.process_id.in_([1, 2]))
+    return queries
+
+def check(engine) -> list[str]:
+    failures = []
+    with engine.connect() as conn:
+        for name, stmt in hot_queries().items():
+            compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+            params = tuple(None for _ in compiled.positiontup or ())
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+            bad = [line for line in plan if FULL_SCAN.match(line) or TEMP_SORT.search(line)]
+            status = "FAIL" if bad else "ok"
+            print(f"{status:4} {name}: {' | '.join(plan)}")
+            if bad:
+                failures.append(name)
+    return failures
+
+# Run this with:
+# python -m backend.check_query_plans
+if __name__ == "__main__":
+    engine = create_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+    failures = check(engine)
+    if failures:
+        print(f"\n{len(failures)} hot queries fall back to a full scan or sort: {', '.join(failures)}")
+        sys.exit(1)
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, func
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta
 from .models import CommentProcess, Comment, User, CommentProcessUserLink, Status
 from .db import get_session
+from .pagination import paginate, finish_page, filter_rows
+from .progress import ProcessProgress, get_progress
+from .events import Action, emit_quietly, redis
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timedelta
@@ -62,7 +65,8 @@ class CommentRead(BaseModel):
         orm_mode = True
 
 @router.post("/process", response_model=CommentProcessRead)
-async def create_comment_process(data: CommentProcessCreate, session: AsyncSession = Depends(get_session)):
+async def create_comment_process(
+    data: CommentProcessCreate, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_session)):
     comment_process = CommentProcess(
         name=data.name,
         text=data.text,
@@ -114,10 +118,17 @@ async def create_comment_process(data: CommentProcessCreate, session: AsyncSessi
             random_minutes = random.randint(data.interval_range_start, data.interval_range_end)
             current_time = current_time+ timedelta(minutes=random_minutes)
 
+    comment_process.total_count = comment_process.queued_count = len(users)
+
     await session.commit()
     await session.refresh(comment_process)
+    background_tasks.add_task(emit_quietly, redis, Action.commentprocess_create, comment_process.model_dump(), process_id=comment_process.id, status=comment_process.status)
     return comment_process
 
+@router.get("/process/{process_id}/progress", response_model=ProcessProgress)
+async def get_comment_process_progress(process_id: int, session: AsyncSession = Depends(get_session)):
+    return await get_progress(session, CommentProcess, process_id)
+
 @router.get("/process/count")
 async def get_all_processes_count(session : AsyncSession = Depends(get_session)):
     result = await session.execute(select(func.count(CommentProcess.id)))
@@ -127,35 +138,37 @@ async def get_all_processes_count(session : AsyncSession = Depends(get_session))
 
 @router.get("/process", response_model=List[CommentProcessRead])
 async def list_comment_processes(
+    response: Response,
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
     limit: int = Query(10, ge=1, description="Items per page (must be > 0)"),
+    cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header"),
+    status: Optional[Status] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
     session: AsyncSession = Depends(get_session)
 ):
-    offset = (page - 1) * limit
-    result = await session.execute(
-        select(CommentProcess)
-        .options(selectinload(CommentProcess.users))
-        .offset(offset)
-        .limit(limit)
-    )
-    return result.scalars().all()
+    stmt = select(CommentProcess).options(selectinload(CommentProcess.users))
+    stmt = filter_rows(stmt, CommentProcess, status, created_after=created_after, created_before=created_before)
+    result = await session.execute(paginate(stmt, CommentProcess, limit, cursor, page))
+    return finish_page(result.scalars().all(), limit, response)
 
 
 @router.get("/", response_model=List[CommentRead])
 async def list_comments(
+    response: Response,
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
     limit: int = Query(10, ge=1, description="Items per page (must be > 0)"),
+    cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header"),
+    status: Optional[Status] = Query(None),
+    process_id: Optional[int] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
     session: AsyncSession = Depends(get_session)
 ):
-    offset = (page - 1) * limit
-    
-    result = await session.execute(
-        select(Comment)
-        .options(selectinload(Comment.user))
-        .offset(offset)
-        .limit(limit)
-    )
-    return result.scalars().all()
+    stmt = select(Comment).options(selectinload(Comment.user))
+    stmt = filter_rows(stmt, Comment, status, process_id, created_after, created_before)
+    result = await session.execute(paginate(stmt, Comment, limit, cursor, page))
+    return finish_page(result.scalars().all(), limit, response)
 
 @router.get("/count")
 async def get_all_processes_count(session : AsyncSession = Depends(get_session)):
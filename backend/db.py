@@ -1,27 +1,48 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import SQLModel
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from contextlib import contextmanager
+from .config import settings
 
-DATABASE_URL = "sqlite+aiosqlite:///database.db"
+def engine_options(url: str) -> dict:
+    """Pool settings for server databases; SQLite keeps SQLAlchemy's defaults."""
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": True,
+    }
 
-engine = create_async_engine(DATABASE_URL)
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets API reads run while a worker commits; the rest trades a little
+    durability on power loss (synchronous=NORMAL) for far fewer fsyncs."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout}")
+    cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+    cursor.execute(f"PRAGMA cache_size={settings.sqlite_cache_size}")
+    cursor.close()
+
+DATABASE_URL = settings.resolved_database_url
+SYNC_DATABASE_URL = settings.resolved_sync_database_url
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
-sync_engine = create_engine("sqlite:///database.db", echo=True)
+# Used by Celery workers and other code that runs outside the event loop
+sync_engine = create_engine(SYNC_DATABASE_URL, **engine_options(SYNC_DATABASE_URL))
 sync_session = sessionmaker(sync_engine, autoflush=False)
-sync_engine_celery = create_engine("sqlite:///./backend/database.db")
-sync_session_celery = sessionmaker(sync_engine_celery, autoflush=False)
 
-@contextmanager
-def get_session_celery()->Session:
-    session : Session = sync_session_celery()
-    try:
-        yield session
-    finally:
-        session.close()
+if engine.dialect.name == "sqlite":
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+if sync_engine.dialect.name == "sqlite":
+    event.listen(sync_engine, "connect", set_sqlite_pragmas)
 
 @contextmanager
 def get_session_sync() -> Session:
@@ -31,6 +52,9 @@ def get_session_sync() -> Session:
     finally:
         session.close()
 
+# Celery tasks historically used their own engine; they now share sync_engine
+get_session_celery = get_session_sync
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
@@ -38,4 +62,3 @@ async def init_db():
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
-        
\ No newline at end of file
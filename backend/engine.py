@@ -0,0 +1,353 @@
+import asyncio
+import hashlib
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from redis.asyncio import Redis
+from sqlalchemy import select, update
+from backend.config import settings
+from backend.db import get_session_celery
+from backend.lib.graph import QuotaWaitError, graph, proxy_url
+from backend.progress import record_progress
+from backend.models import Comment, CommentProcess, Reaction, ReactionProcess, ReactionType, Status, User, Post, PostProcess, PostTarget, Group, Page, Media, MediaType, Proxy
+
+# Requests in flight across all tokens
+GRAPH_CONCURRENCY = 50
+# Minimum seconds between two calls made with the same access token
+TOKEN_MIN_INTERVAL = 1.0
+
+_loop: asyncio.AbstractEventLoop | None = None
+
+def run_async(coro):
+    """Run ``coro`` on this worker process's long-lived event loop.
+
+    Reusing one loop keeps the pooled Graph connections open between tasks.
+    """
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(coro)
+
+# Reserves the next free call slot of a token and returns how long (ms) the
+# caller must wait for it; times come from the Redis clock so every worker
+# host agrees on them
+RESERVE_SLOT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local slot = math.max(now, tonumber(redis.call('GET', KEYS[1]) or 0))
+local next_slot = slot + tonumber(ARGV[1])
+redis.call('SET', KEYS[1], next_slot, 'PX', next_slot - now + 1000)
+return slot - now
+"""
+
+class TokenRateLimiter:
+    """Spaces out calls per access token; different tokens never wait on each other.
+
+    Slots are reserved in Redis, so tasks and worker processes using the
+    same token are spaced out against each other. If Redis cannot be
+    reached, calls are spaced within this process only.
+    """
+
+    def __init__(self, min_interval: float = TOKEN_MIN_INTERVAL, prefix: str = "graph:token"):
+        self.min_interval = min_interval
+        self.prefix = prefix
+        self._reserve = None
+        self._last_call: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    @property
+    def reserve(self):
+        # Connects on run_async's loop, like GraphClient.media_cache
+        if self._reserve is None:
+            self._reserve = Redis.from_url(settings.redis_url).register_script(RESERVE_SLOT)
+        return self._reserve
+
+    def key(self, token: str) -> str:
+        # Only a fingerprint of the token is kept
+        return f"{self.prefix}:{hashlib.sha256(token.encode()).hexdigest()[:16]}"
+
+    async def wait(self, token: str):
+        try:
+            delay = await self.reserve(keys=[self.key(token)], args=[int(self.min_interval * 1000)]) / 1000
+        except Exception as e:
+            print(f"Token rate limiter falling back to this process: {e!r}")
+            await self._wait_locally(token)
+            return
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _wait_locally(self, token: str):
+        async with self._locks[token]:
+            delay = self._last_call.get(token, 0) + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_call[token] = time.monotonic()
+
+token_limiter = TokenRateLimiter()
+
+def reaction_graph_type(type_of: ReactionType) -> str:
+    if type_of == ReactionType.random:
+        type_of = random.choice([t for t in ReactionType if t != ReactionType.random])
+    return type_of.value.upper()
+
+def published_update(row_id: int, **values) -> dict:
+    return {"id": row_id, "status": Status.published, "published_at": datetime.utcnow(), "message": None, **values}
+
+def error_update(row_id: int, error) -> dict:
+    return {"id": row_id, "status": Status.error, "message": str(error)}
+
+def failed_update(row_id: int, error, due_status: Status) -> dict:
+    """Error the row, unless Graph asked for a long pause: then it goes back
+    to ``due_status``, rescheduled for when the pause is over."""
+    if isinstance(error, QuotaWaitError):
+        scheduled_for = datetime.utcnow() + timedelta(seconds=error.delay)
+        return {"id": row_id, "status": due_status, "message": str(error), "scheduled_for": scheduled_for}
+    return error_update(row_id, error)
+
+async def _publish_comment(comment: Comment, token: str) -> dict:
+    data = await graph.post(
+        f"/{comment.post_id}/comments",
+        data={"message": comment.text, "access_token": token}
+    )
+    return {"fb_id": data.get("id")}
+
+async def _publish_reaction(reaction: Reaction, token: str) -> dict:
+    await graph.post(
+        f"/{reaction.post_id}/reactions",
+        data={"type": reaction_graph_type(reaction.type_of), "access_token": token}
+    )
+    return {}
+
+async def run_jobs(
+    jobs, publish, due_status: Status,
+    group_key=lambda row, token: (row.post_id, token), limiter: TokenRateLimiter | None = None
+):
+    """Execute ``(row, token)`` jobs and return one bulk-update dict per row.
+
+    Jobs sharing a ``group_key`` run in order, groups run concurrently, and
+    every call goes through the per-token rate limiter. Rows Graph asked
+    to pause for too long go back to ``due_status`` (see failed_update).
+    """
+    limiter = limiter or token_limiter
+    semaphore = asyncio.Semaphore(GRAPH_CONCURRENCY)
+    groups = defaultdict(list)
+    for row, token in jobs:
+        groups[group_key(row, token)].append((row, token))
+
+    updates = []
+
+    async def run_group(group):
+        for row, token in group:
+            if not token:
+                updates.append(error_update(row.id, "No access token"))
+                continue
+            await limiter.wait(token)
+            async with semaphore:
+                try:
+                    updates.append(published_update(row.id, **await publish(row, token)))
+                except Exception as e:
+                    updates.append(failed_update(row.id, e, due_status))
+
+    await asyncio.gather(*(run_group(group) for group in groups.values()))
+    return updates
+
+def take_claimed(session, model, ids) -> tuple[list[int], datetime]:
+    """Return the ids among ``ids`` that the scheduler claimed (status Running)
+    and the ``claimed_at`` this worker now holds them with.
+
+    Anything else (a stale or redelivered message, a row already finished
+    or requeued) is skipped. The claim is renewed so the scheduler does not
+    requeue rows while they are being published.
+    """
+    claimed_at = datetime.utcnow()
+    claimed = session.execute(
+        update(model)
+        .where(model.id.in_(ids), model.status == Status.running)
+        .values(claimed_at=claimed_at)
+        .returning(model.id)
+    ).scalars().all()
+    session.commit()
+    return claimed, claimed_at
+
+def write_claimed(session, model, claimed_at: datetime, updates: list[dict]) -> list[dict]:
+    """Write ``updates`` for the rows this worker still holds; return those written.
+
+    A row requeued by the scheduler meanwhile (and maybe claimed again by
+    another worker) has another ``claimed_at`` and is left alone.
+    """
+    held = set(session.execute(
+        update(model)
+        .where(
+            model.id.in_([row_update["id"] for row_update in updates]),
+            model.status == Status.running,
+            model.claimed_at == claimed_at
+        )
+        .values(claimed_at=None)
+        .returning(model.id)
+    ).scalars().all())
+    lost = len(updates) - len(held)
+    if lost:
+        print(f"Skipped {lost} {model.__tablename__} results whose claim was taken over")
+    updates = [row_update for row_update in updates if row_update["id"] in held]
+    if updates:
+        session.execute(update(model), updates)
+    return updates
+
+def _execute(model, process_model, ids, publish):
+    with get_session_celery() as session:
+        ids, claimed_at = take_claimed(session, model, ids)
+        if not ids:
+            return []
+        jobs = session.execute(
+            select(model, User.access_token)
+            .join(User, model.user_id == User.id, isouter=True)
+            .where(model.id.in_(ids))
+        ).all()
+        if not jobs:
+            return []
+        session.expunge_all()
+
+        updates = run_async(run_jobs(jobs, publish, Status.pending))
+
+        row_processes = {row.id: row.process_id for row, _ in jobs}
+        updates = write_claimed(session, model, claimed_at, updates)
+        record_progress(session, process_model, row_processes, updates)
+        session.commit()
+        return [{**row_update, "process_id": row_processes[row_update["id"]]} for row_update in updates]
+
+def execute_comments(comment_ids) -> list[dict]:
+    """Publish the given comments and bulk-write their status back.
+
+    Set GRAPH_API_URL to a local stub to benchmark the engine's throughput.
+    """
+    return _execute(Comment, CommentProcess, comment_ids, _publish_comment)
+
+def execute_reactions(reaction_ids) -> list[dict]:
+    return _execute(Reaction, ReactionProcess, reaction_ids, _publish_reaction)
+
+def execute_posts(post_ids) -> list[dict]:
+    """Publish the given claimed posts, with their process medias, and bulk-write the results."""
+    with get_session_celery() as session:
+        post_ids, claimed_at = take_claimed(session, Post, post_ids)
+        if not post_ids:
+            return []
+        posts = session.execute(select(Post).where(Post.id.in_(post_ids))).scalars().all()
+        if not posts:
+            return []
+
+        process_ids = {post.process_id for post in posts if post.process_id}
+        medias = defaultdict(list)
+        process_proxies = {}
+        if process_ids:
+            for media in session.execute(select(Media).where(Media.process_id.in_(process_ids))).scalars():
+                medias[media.process_id].append(media)
+            process_proxies = dict(session.execute(
+                select(PostProcess.id, PostProcess.proxy_id).where(PostProcess.id.in_(process_ids))
+            ).all())
+
+        proxy_ids = {post.proxy_id or process_proxies.get(post.process_id) for post in posts} - {None}
+        proxies = {}
+        if proxy_ids:
+            proxies = {proxy.id: proxy for proxy in session.execute(select(Proxy).where(Proxy.id.in_(proxy_ids))).scalars()}
+
+        target_fbids = {}
+        for target, model in ((PostTarget.group, Group), (PostTarget.page, Page)):
+            target_ids = [int(post.target_id) for post in posts if post.target == target]
+            if target_ids:
+                for target_id, fbid in session.execute(select(model.id, model.fbid).where(model.id.in_(target_ids))).all():
+                    target_fbids[(target, str(target_id))] = fbid
+        session.expunge_all()
+
+        def context(post: Post):
+            proxy = proxies.get(post.proxy_id or process_proxies.get(post.process_id))
+            return target_fbids.get((post.target, post.target_id)), medias[post.process_id], proxy_url(proxy)
+
+        async def publish(post: Post, token: str) -> dict:
+            target_fbid, post_medias, proxy = context(post)
+            if target_fbid is None:
+                raise ValueError(f"{post.target.value} {post.target_id} no longer exists")
+            fb_id = await graph.publish_post(post, target_fbid, token, medias=post_medias, proxy=proxy)
+            return {"fb_id": fb_id}
+
+        # Video posts need their own upload call; everything else is merged
+        # into Graph batch requests, one set per proxy
+        single, batched = [], defaultdict(list)
+        for post in posts:
+            target_fbid, post_medias, proxy = context(post)
+            if any(media.type_of == MediaType.video for media in post_medias):
+                single.append((post, post.access_token))
+            else:
+                batched[proxy].append(post)
+
+        async def publish_all():
+            results = await asyncio.gather(
+                run_jobs(single, publish, Status.queued, group_key=lambda post, token: (post.target, post.target_id, token)),
+                *(publish_batch(batch, context, token_limiter) for batch in batched.values())
+            )
+            return [row_update for result in results for row_update in result]
+
+        updates = run_async(publish_all())
+
+        post_processes = {post.id: post.process_id for post in posts}
+        updates = write_claimed(session, Post, claimed_at, updates)
+        record_progress(session, PostProcess, post_processes, updates)
+        session.commit()
+        # The process id lets subscribers be notified per process
+        return [{**row_update, "process_id": post_processes[row_update["id"]]} for row_update in updates]
+
+async def publish_batch(posts: list[Post], context, limiter: TokenRateLimiter) -> list[dict]:
+    """Publish ``posts`` (all behind the same proxy) through the Graph batch endpoint.
+
+    Images are uploaded once per upload scope (see GraphClient.feed_payload);
+    the feed calls themselves go out up to BATCH_LIMIT per HTTP request and
+    each result is mapped back onto its post. Cached photo ids of failed
+    posts are dropped so a retry uploads them again.
+    """
+    updates = []
+    ready = []
+
+    async def prepare(post: Post):
+        target_fbid, post_medias, proxy = context(post)
+        if not post.access_token:
+            raise ValueError("No access token")
+        if target_fbid is None:
+            raise ValueError(f"{post.target.value} {post.target_id} no longer exists")
+        # Only photo uploads are calls of their own; the feed call rides in the batch
+        payload = await graph.feed_payload(
+            post, target_fbid, post.access_token, post_medias, proxy=proxy,
+            throttle=lambda: limiter.wait(post.access_token)
+        )
+        return {"method": "POST", "relative_url": f"{target_fbid}/feed", "body": payload}
+
+    operations = await asyncio.gather(*(prepare(post) for post in posts), return_exceptions=True)
+    for post, operation in zip(posts, operations):
+        if isinstance(operation, Exception):
+            updates.append(failed_update(post.id, operation, Status.queued))
+        else:
+            ready.append((post, operation))
+
+    if not ready:
+        return updates
+
+    proxy = context(ready[0][0])[2]
+    try:
+        results = await graph.batch([operation for _, operation in ready], proxy=proxy)
+    except Exception as e:
+        results = [e] * len(ready)
+
+    failed = []
+    for (post, _), result in zip(ready, results):
+        if isinstance(result, Exception):
+            updates.append(failed_update(post.id, result, Status.queued))
+            failed.append(post)
+        else:
+            updates.append(published_update(post.id, fb_id=result.get("id")))
+
+    for post in failed:
+        target_fbid, post_medias, _ = context(post)
+        try:
+            await graph.forget_uploads(target_fbid, post.access_token, post_medias)
+        except Exception as e:
+            print(f"Could not drop cached uploads for post {post.id}: {e}")
+    return updates
@@ -0,0 +1,108 @@
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any
+from redis.asyncio import BlockingConnectionPool, Redis
+from .config import settings
+
+# Realtime events for the dashboards go through one Redis stream. API
+# processes and Celery workers append to it; every API process reads it once
+# (see ws.EventBridge) and fans events out to its own websocket clients.
+# The last EVENTS_MAXLEN entries are kept so clients can resume after a
+# reconnect or an API restart.
+
+EVENTS_STREAM = "events"
+EVENTS_MAXLEN = 10_000
+
+# One pool per API process, shared by the handlers and the bridge; callers
+# wait for a free connection instead of opening more
+redis = Redis(connection_pool=BlockingConnectionPool.from_url(
+    settings.redis_url, max_connections=settings.redis_max_connections, timeout=10
+))
+
+class Action(str, Enum):
+    postprocess_create = "postprocess.create"
+    post_create = "post.create"
+    post_update = "post.update"
+    commentprocess_create = "commentprocess.create"
+    comment_update = "comment.update"
+    reactionprocess_create = "reactionprocess.create"
+    reaction_update = "reaction.update"
+
+# Events whose data is a list of per-row deltas, merged by the bridge
+UPDATE_ACTIONS = {Action.post_update.value, Action.comment_update.value, Action.reaction_update.value}
+# Never stored in the stream nor sent to dashboards, wherever they appear in a payload
+SECRET_FIELDS = {"access_token"}
+
+def _value(obj: Any) -> Any:
+    return obj.value if isinstance(obj, Enum) else obj
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+def encode(message: Any) -> str:
+    return json.dumps(message, default=_json_default)
+
+def strip_secrets(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return {k: strip_secrets(v) for k, v in obj.items() if k not in SECRET_FIELDS}
+    elif isinstance(obj, list):
+        return [strip_secrets(i) for i in obj]
+    return obj
+
+def event_fields(action: Action, data: Any, process_id: int | None = None, status: str | None = None) -> dict:
+    fields = {"action": _value(action), "data": encode(strip_secrets(data))}
+    if process_id is not None:
+        fields["process_id"] = process_id
+    if status is not None:
+        fields["status"] = _value(status)
+    return fields
+
+def decode_fields(fields: dict) -> tuple[str, Any, int | None, str | None]:
+    """Return (action, data, process_id, status) from a stream entry."""
+    fields = {
+        (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+        for k, v in fields.items()
+    }
+    process_id = fields.get("process_id")
+    return fields["action"], json.loads(fields["data"]), int(process_id) if process_id else None, fields.get("status")
+
+def emit(client, action: Action, data: Any, process_id: int | None = None, status: str | None = None) -> str:
+    """Append an event with a sync ``redis.Redis`` (Celery workers)."""
+    return client.xadd(EVENTS_STREAM, event_fields(action, data, process_id, status), maxlen=EVENTS_MAXLEN, approximate=True)
+
+async def emit_async(client, action: Action, data: Any, process_id: int | None = None, status: str | None = None) -> str:
+    """Append an event with a ``redis.asyncio.Redis`` (API handlers)."""
+    return await client.xadd(EVENTS_STREAM, event_fields(action, data, process_id, status), maxlen=EVENTS_MAXLEN, approximate=True)
+
+async def emit_quietly(client, action: Action, data: Any, process_id: int | None = None, status: str | None = None) -> str | None:
+    """``emit_async`` for API handlers, run as a background task once the
+    response is sent: a failure is logged, never raised, since the rows
+    are already committed."""
+    try:
+        return await emit_async(client, action, data, process_id, status)
+    except Exception as e:
+        print(f"Could not emit {_value(action)} event: {e}")
+        return None
+
+def status_delta(update: dict) -> dict:
+    """The fields of a row update the dashboards show, ready for JSON."""
+    published_at = update.get("published_at")
+    delta = {
+        "id": update["id"],
+        "process_id": update["process_id"],
+        "status": _value(update["status"]),
+        "message": update.get("message"),
+    }
+    if update.get("fb_id"):
+        delta["fb_id"] = update["fb_id"]
+    if published_at:
+        delta["published_at"] = published_at.isoformat()
+    return delta
+
+def stream_id(event_id: str) -> tuple[int, int]:
+    """Parse a stream entry id ("<ms>-<seq>") so ids can be compared."""
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
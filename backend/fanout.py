@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Post, PostProcess, Group, PostTarget, Status
+
+# Creates the Post rows of a PostProcess. Shared by the API and bulk
+# importers; everything runs inside the caller's transaction and nothing is
+# committed here.
+
+def next_scheduled_for(post_process: PostProcess, current: datetime) -> datetime:
+    if post_process.interval:
+        return current + timedelta(minutes=post_process.interval)
+    elif post_process.interval_range_start and post_process.interval_range_end:
+        random_interval = random.randint(post_process.interval_range_start, post_process.interval_range_end)
+        return current + timedelta(minutes=random_interval)
+    return current
+
+def build_post_rows(post_process: PostProcess) -> List[dict]:
+    """Compute the Post rows for every linked group and page (groups first).
+
+    Expects ``groups`` (with ``admin``) and ``pages`` to be eager-loaded.
+    Posts of an AI process start Pending so the scheduler leaves them alone
+    until ``tasks.process_posts`` has rewritten them and queued them.
+    """
+    rows = []
+    status = Status.pending if post_process.use_ai else Status.queued
+    scheduled_for = post_process.scheduled_for or datetime.utcnow()
+    created_at = datetime.utcnow()
+
+    targets = [
+        (PostTarget.group, group, group.admin.access_token if group.admin else None)
+        for group in post_process.groups
+    ] + [
+        (PostTarget.page, page, page.access_token)
+        for page in post_process.pages
+    ]
+
+    for target, obj, access_token in targets:
+        rows.append({
+            "text": post_process.text or "",
+            "scheduled_for": scheduled_for,
+            "target": target,
+            "target_id": str(obj.id),
+            "fb_id": obj.fbid,
+            "access_token": access_token,
+            "process_id": post_process.id,
+            "status": status,
+            "created_at": created_at,
+        })
+        scheduled_for = next_scheduled_for(post_process, scheduled_for)
+
+    return rows
+
+def targets_query(process_id: int):
+    return (
+        select(PostProcess)
+        .options(
+            selectinload(PostProcess.groups).selectinload(Group.admin),
+            selectinload(PostProcess.pages)
+        )
+        .where(PostProcess.id == process_id)
+    )
+
+def _insert_posts(post_process: PostProcess, rows: List[dict], post_ids: List[int]) -> List[dict]:
+    post_process.total_count = post_process.queued_count = len(rows)
+    return [{**row, "id": post_id} for row, post_id in zip(rows, post_ids)]
+
+async def fan_out_posts(session: AsyncSession, post_process: PostProcess) -> List[dict]:
+    """Insert one Post per linked group and page with a single bulk INSERT.
+
+    ``post_process`` must already be flushed with its links. Returns the
+    inserted rows, with their ids, in schedule order.
+    """
+    post_process = (await session.execute(targets_query(post_process.id))).scalar_one()
+    rows = build_post_rows(post_process)
+    post_ids = []
+    if rows:
+        result = await session.execute(insert(Post).returning(Post.id, sort_by_parameter_order=True), rows)
+        post_ids = result.scalars().all()
+    return _insert_posts(post_process, rows, post_ids)
+
+def fan_out_posts_sync(session: Session, post_process: PostProcess) -> List[dict]:
+    """Same as ``fan_out_posts`` for sync sessions (scripts, workers)."""
+    post_process = session.execute(targets_query(post_process.id)).scalar_one()
+    rows = build_post_rows(post_process)
+    post_ids = []
+    if rows:
+        post_ids = session.execute(insert(Post).returning(Post.id, sort_by_parameter_order=True), rows).scalars().all()
+    return _insert_posts(post_process, rows, post_ids)
@@ -1,6 +1,11 @@
 import os
+import json
+import time
+import asyncio
 import httpx
+from collections import OrderedDict
 from ..config import settings
+from .singleflight import SingleFlight
 
 # Create a reusable HTTP client instance
 ai = httpx.AsyncClient(
@@ -10,5 +15,114 @@ ai = httpx.AsyncClient(
         'accept': 'application/json',
         "Ocp-Apim-Subscription-Key" : settings.lite_llm_api_key
     },
-    timeout=10.0
-)
\ No newline at end of file
+    timeout=httpx.Timeout(60.0, connect=10.0),
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=20)
+)
+
+# Completions allowed in flight at once per process
+AI_CONCURRENCY = 10
+AI_CACHE_SIZE = 1024
+AI_CACHE_TTL = 24 * 60 * 60
+
+VARIANTS_PROMPT = (
+    "Rewrite the following social media post {count} times. Keep the meaning, "
+    "language and tone, but word every rewrite differently from the others. "
+    'Respond only with JSON of the form {{"variants": ["...", "..."]}}.\n\n'
+    "Post:\n{text}"
+)
+
+class CompletionCache:
+    """LRU cache of completions with a per-entry TTL (in seconds)."""
+
+    def __init__(self, maxsize: int = AI_CACHE_SIZE, ttl: float = AI_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+
+    def get(self, key: tuple) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple, value: str):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+class AIService:
+    """Concurrency-limited, cached chat completions on top of the shared ``ai`` client.
+
+    The same (model, prompt, seed) is only ever requested once while cached,
+    including when several callers ask for it at the same time.
+    """
+
+    def __init__(self, client: httpx.AsyncClient = ai, concurrency: int = AI_CONCURRENCY, cache: CompletionCache | None = None):
+        self.client = client
+        self.concurrency = concurrency
+        self.cache = cache or CompletionCache()
+        self._semaphore: asyncio.Semaphore | None = None
+        self._completions = SingleFlight()
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the loop that actually runs completions
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def complete(self, prompt: str, model: str, seed: int = 0, json_mode: bool = False) -> str:
+        key = (model, prompt, seed, json_mode)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        return await self._completions.do(key, lambda: self._complete(key, prompt, model, seed, json_mode))
+
+    async def _complete(self, key: tuple, prompt: str, model: str, seed: int, json_mode: bool) -> str:
+        async with self.semaphore:
+            payload = {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "seed": seed,
+            }
+            if json_mode:
+                payload["response_format"] = {"type": "json_object"}
+            response = await self.client.post("/chat/completions", json=payload)
+        response.raise_for_status()
+        text = response.json()['choices'][0]['message']['content']
+        self.cache.set(key, text)
+        return text
+
+    async def variants(self, text: str, model: str, count: int, seed: int = 0) -> list[str]:
+        """Ask for ``count`` distinct rewrites of ``text`` in one JSON completion.
+
+        May return fewer than ``count`` (or none) if the model under-delivers
+        or the response is not valid JSON.
+        """
+        content = await self.complete(VARIANTS_PROMPT.format(count=count, text=text), model, seed, json_mode=True)
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return []
+        variants = data.get("variants", []) if isinstance(data, dict) else []
+
+        unique = []
+        for variant in variants:
+            if isinstance(variant, str) and variant.strip() and variant.strip() not in unique:
+                unique.append(variant.strip())
+        return unique[:count]
+
+    async def complete_many(self, prompts: list[tuple[str, str, int]]) -> list[str | Exception]:
+        """Run ``(prompt, model, seed)`` completions concurrently, keeping order."""
+        return await asyncio.gather(
+            *(self.complete(prompt, model, seed) for prompt, model, seed in prompts),
+            return_exceptions=True
+        )
+
+ai_service = AIService()
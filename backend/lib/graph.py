@@ -0,0 +1,389 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+import httpx
+from redis.asyncio import Redis
+from urllib.parse import urlencode
+from ..config import settings
+from ..models import MediaType
+from .singleflight import SingleFlight
+
+# Graph error codes worth retrying: transient errors and rate limiting
+RETRYABLE_ERROR_CODES = {1, 2, 4, 17, 32, 341, 613}
+# The rate-limit subset: safe to resend for batch operations, since Graph
+# rejected them without running them
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 613}
+# Transport errors raised before the request reached Graph
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Methods Graph can safely run twice
+IDEMPOTENT_METHODS = {"GET", "HEAD", "DELETE"}
+# Operations accepted by one call to the batch endpoint
+BATCH_LIMIT = 50
+# Start slowing down once any usage header passes this percentage
+USAGE_THRESHOLD = 90
+
+class GraphError(Exception):
+    def __init__(self, status_code: int, error: dict):
+        self.status_code = status_code
+        self.error = error
+        super().__init__(error.get("message") or f"Graph API error {status_code}")
+
+    @property
+    def code(self) -> int | None:
+        return self.error.get("code")
+
+    @property
+    def rate_limited(self) -> bool:
+        return self.status_code == 429 or self.code in RATE_LIMIT_ERROR_CODES
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code >= 500 or self.status_code == 429 or self.code in RETRYABLE_ERROR_CODES
+
+class QuotaWaitError(GraphError):
+    """The usage headers asked for a longer pause than the client may wait.
+
+    Nothing was sent; the caller should try again after ``delay`` seconds.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        super().__init__(429, {"message": f"Rate limited for {delay:.0f} s"})
+
+def proxy_url(proxy) -> str | None:
+    """Build an httpx proxy URL from a ``Proxy`` row (or None)."""
+    if proxy is None or not proxy.active:
+        return None
+    auth = f":{proxy.password}@" if proxy.password else ""
+    return f"http://{auth}{proxy.hostname}:{proxy.port}"
+
+def app_access_token() -> str:
+    return f"{settings.facebook_client_id}|{settings.facebook_client_secret}"
+
+def request_token(kwargs: dict) -> str | None:
+    """The access token a request is made with, from its form data or query."""
+    for key in ("data", "params"):
+        values = kwargs.get(key)
+        if isinstance(values, dict) and values.get("access_token"):
+            return values["access_token"]
+    return None
+
+def post_message(post) -> str:
+    return post.text or post.message or ""
+
+def publish_url(media) -> str:
+    """The processed variant of ``media`` when the pipeline made one, else the original."""
+    return media.publish_url or media.url
+
+def upload_scope(target_fbid: str, access_token: str) -> str:
+    """Where an unpublished photo can be attached: the node it was uploaded
+    to, with the token that uploaded it. Only a fingerprint of the token is kept."""
+    return f"{target_fbid}:{hashlib.sha256(access_token.encode()).hexdigest()[:16]}"
+
+class MediaUploadCache:
+    """Graph ids of medias already uploaded unpublished, per upload scope.
+
+    Entries live in Redis for ``ttl`` seconds so every worker reuses them,
+    and concurrent uploads of the same media to the same scope are merged
+    into one call.
+    """
+
+    def __init__(self, ttl: int = settings.graph_media_ttl, prefix: str = "graph:media"):
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis: Redis | None = None
+        self._uploads = SingleFlight()
+
+    @property
+    def redis(self) -> Redis:
+        # Workers only publish from engine.run_async's loop, so open it there
+        if self._redis is None:
+            self._redis = Redis.from_url(settings.redis_url)
+        return self._redis
+
+    def key(self, media, scope: str) -> str:
+        return f"{self.prefix}:{media.content_hash or media.id}:{scope}"
+
+    async def get_or_upload(self, key: str, upload) -> str:
+        return await self._uploads.do(key, lambda: self._get_or_upload(key, upload))
+
+    async def _get_or_upload(self, key: str, upload) -> str:
+        cached = await self.redis.get(key)
+        if cached is not None:
+            return cached.decode()
+        media_fbid = await upload()
+        await self.redis.set(key, media_fbid, ex=self.ttl)
+        return media_fbid
+
+    async def invalidate(self, keys: list[str]):
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def aclose(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+class GraphClient:
+    """Shared Graph API client.
+
+    Keeps one pooled HTTP/2 httpx client per proxy; each of those pools its
+    connections per host. Requests are retried with jittered exponential
+    backoff (writes only when Graph cannot have run them) and paused while
+    the usage headers report a rate limit is close: the app limit pauses
+    every call, a business use case limit only the calls made with the
+    token that hit it.
+    """
+
+    def __init__(
+        self,
+        base_url: str = settings.graph_api_url,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_connections: int = 200,
+        timeout: float = 30.0,
+        max_quota_wait: float = 5 * 60,
+    ):
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.timeout = timeout
+        # Longer pauses raise QuotaWaitError, so workers never sit on their
+        # claims while a business use case limit recovers
+        self.max_quota_wait = max_quota_wait
+        self._clients: dict[str | None, httpx.AsyncClient] = {}
+        # App-wide pause (X-App-Usage) and per-token pauses (business use case usage)
+        self._throttled_until = 0.0
+        self._token_throttled_until: dict[str, float] = {}
+        self.media_cache = MediaUploadCache()
+
+    def client_for(self, proxy: str | None = None) -> httpx.AsyncClient:
+        client = self._clients.get(proxy)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=True,
+                proxy=proxy,
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+            self._clients[proxy] = client
+        return client
+
+    async def aclose(self):
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+        await self.media_cache.aclose()
+
+    async def request(
+        self, method: str, path: str, *, proxy: str | None = None, idempotent: bool | None = None, **kwargs
+    ) -> dict | list:
+        """Send a Graph call and return its parsed body.
+
+        ``idempotent`` defaults to whether ``method`` is; a non-idempotent
+        call is not resent after a timeout, a 5xx or a transient Graph error,
+        since Graph may already have created the object.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        client = self.client_for(proxy)
+        attempt = 0
+        while True:
+            token = request_token(kwargs)
+            await self._wait_for_quota(token)
+            try:
+                response = await client.request(method, path, **kwargs)
+                self._record_usage(response.headers, token)
+                try:
+                    data = response.json() if response.content else {}
+                except ValueError:
+                    data = {"error": {"message": response.text}}
+                if response.is_error or (isinstance(data, dict) and "error" in data):
+                    raise GraphError(response.status_code, data.get("error", {}) if isinstance(data, dict) else {})
+                return data
+            except (httpx.TransportError, GraphError) as e:
+                if not self._can_resend(e, idempotent) or attempt >= self.max_retries:
+                    raise
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            attempt += 1
+
+    def _can_resend(self, error: Exception, idempotent: bool) -> bool:
+        if isinstance(error, GraphError):
+            return error.retryable if idempotent else error.rate_limited
+        return idempotent or isinstance(error, UNSENT_ERRORS)
+
+    async def get(self, path: str, **kwargs) -> dict:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> dict | list:
+        return await self.request("POST", path, **kwargs)
+
+    async def publish_post(self, post, target_fbid: str, access_token: str, medias=(), proxy: str | None = None) -> str:
+        """Publish ``post`` to the feed of ``target_fbid`` and return the Graph post id.
+
+        A video is published as a video post; anything else goes through
+        ``feed_payload`` and one /feed call.
+        """
+        videos = [media for media in medias if media.type_of == MediaType.video]
+        if videos:
+            data = await self.post(
+                f"/{target_fbid}/videos",
+                data={"file_url": publish_url(videos[0]), "description": post_message(post), "access_token": access_token},
+                proxy=proxy
+            )
+            return data["id"]
+
+        payload = await self.feed_payload(post, target_fbid, access_token, medias, proxy=proxy)
+        data = await self.post(f"/{target_fbid}/feed", data=payload, proxy=proxy)
+        return data["id"]
+
+    async def feed_payload(
+        self, post, target_fbid: str, access_token: str, medias=(), proxy: str | None = None, throttle=None
+    ) -> dict:
+        """Return the /feed form fields for ``post``.
+
+        Images are uploaded unpublished once per upload scope and their ids
+        reused from ``media_cache`` until they expire. ``throttle`` (an async
+        callable) is awaited before each upload actually sent.
+        """
+        payload = {"message": post_message(post), "access_token": access_token}
+        photos = [media for media in medias if media.type_of in (MediaType.image, MediaType.gif)]
+        scope = upload_scope(target_fbid, access_token)
+
+        async def upload(media):
+            if throttle is not None:
+                await throttle()
+            return await self.upload_photo(target_fbid, publish_url(media), access_token, proxy=proxy)
+
+        media_ids = await asyncio.gather(*(
+            self.media_cache.get_or_upload(self.media_cache.key(media, scope), lambda media=media: upload(media))
+            for media in photos
+        ))
+        for i, media_id in enumerate(media_ids):
+            payload[f"attached_media[{i}]"] = json.dumps({"media_fbid": media_id})
+        links = [media for media in medias if media.type_of == MediaType.link]
+        if links:
+            payload["link"] = links[0].url
+        return payload
+
+    async def forget_uploads(self, target_fbid: str, access_token: str, medias=()):
+        """Drop the cached photo ids of ``medias`` after a failed post, in case they expired."""
+        scope = upload_scope(target_fbid, access_token)
+        await self.media_cache.invalidate([
+            self.media_cache.key(media, scope) for media in medias
+            if media.type_of in (MediaType.image, MediaType.gif)
+        ])
+
+    async def batch(self, operations: list[dict], proxy: str | None = None) -> list[dict | GraphError]:
+        """Send ``operations`` through the batch endpoint, BATCH_LIMIT per call.
+
+        Each operation is ``{"method", "relative_url", "body"}`` with its own
+        ``access_token`` in ``body``; the call itself uses the app token, so
+        one expired user or page token only fails its own operation.
+        A batch call that fails or times out is not resent, since Graph may
+        have run some of its operations; only operations refused for rate
+        limiting are resent, with the same backoff as ``request``. Returns one parsed body or GraphError per
+        operation, in order.
+        """
+        results: list[dict | GraphError | None] = [None] * len(operations)
+        todo = list(range(len(operations)))
+        attempt = 0
+        while True:
+            for start in range(0, len(todo), BATCH_LIMIT):
+                indexes = todo[start:start + BATCH_LIMIT]
+                chunk_results = await self._batch_call([operations[i] for i in indexes], proxy)
+                for i, result in zip(indexes, chunk_results):
+                    results[i] = result
+            todo = [i for i in todo if isinstance(results[i], GraphError) and results[i].rate_limited]
+            if not todo or attempt >= self.max_retries:
+                return results
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+            attempt += 1
+
+    async def _batch_call(self, chunk: list[dict], proxy: str | None = None) -> list[dict | GraphError]:
+        data = await self.post(
+            "/",
+            data={
+                "batch": json.dumps([
+                    {"method": op["method"], "relative_url": op["relative_url"], "body": urlencode(op["body"])}
+                    for op in chunk
+                ]),
+                "access_token": app_access_token(),
+                "include_headers": "false",
+            },
+            proxy=proxy,
+            idempotent=False
+        )
+        results = []
+        for item in data:
+            if item is None:
+                results.append(GraphError(504, {"message": "Batch operation timed out"}))
+                continue
+            try:
+                body = json.loads(item.get("body") or "{}")
+            except ValueError:
+                body = {"error": {"message": item.get("body")}}
+            if item.get("code") != 200 or "error" in body:
+                results.append(GraphError(item.get("code") or 500, body.get("error", {})))
+            else:
+                results.append(body)
+        return results
+
+    async def upload_photo(self, target_fbid: str, url: str, access_token: str, proxy: str | None = None) -> str:
+        data = await self.post(
+            f"/{target_fbid}/photos",
+            data={"url": url, "published": "false", "access_token": access_token},
+            proxy=proxy
+        )
+        return data["id"]
+
+    async def _wait_for_quota(self, token: str | None = None):
+        now = time.monotonic()
+        until = self._throttled_until
+        if token is not None:
+            token_until = self._token_throttled_until.get(token, 0.0)
+            if token_until <= now:
+                self._token_throttled_until.pop(token, None)
+            until = max(until, token_until)
+        if until - now > self.max_quota_wait:
+            raise QuotaWaitError(until - now)
+        if until > now:
+            await asyncio.sleep(until - now)
+
+    def _record_usage(self, headers: httpx.Headers, token: str | None = None):
+        """Pause on high usage: app usage pauses every call, business use
+        case usage (one page or business) only calls made with ``token``."""
+        if "x-app-usage" in headers:
+            pause = self._usage_pause([json.loads(headers["x-app-usage"])])
+            if pause:
+                self._throttled_until = max(self._throttled_until, time.monotonic() + pause)
+
+        if "x-business-use-case-usage" in headers:
+            usages = [
+                usage
+                for entries in json.loads(headers["x-business-use-case-usage"]).values()
+                for usage in entries
+            ]
+            pause = self._usage_pause(usages)
+            if pause and token is not None:
+                until = max(self._token_throttled_until.get(token, 0.0), time.monotonic() + pause)
+                self._token_throttled_until[token] = until
+
+    def _usage_pause(self, usages: list[dict]) -> float:
+        regain_minutes = max((usage.get("estimated_time_to_regain_access") or 0 for usage in usages), default=0)
+        if regain_minutes:
+            return regain_minutes * 60
+        peak = max(
+            (usage.get(key) or 0 for usage in usages for key in ("call_count", "total_time", "total_cputime")),
+            default=0
+        )
+        if peak >= USAGE_THRESHOLD:
+            # Back off harder the closer we are to 100%
+            return self.backoff * (peak - USAGE_THRESHOLD + 1)
+        return 0.0
+
+graph = GraphClient()
@@ -1,5 +1,5 @@
 import os
-import asyncio
+from contextlib import asynccontextmanager
 from . import auth
 from . import posts
 from . import users
@@ -10,13 +10,26 @@ from . import comments
 from . import reactions
 from . import proxies
 from . import ws
+from .lib.graph import graph
+from .events import redis
+from .pagination import NEXT_CURSOR_HEADER
+from .config import MEDIA_DIR
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
-UPLOAD_DIR = "medias"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ws.bridge.start()
+    yield
+    # Drain: stop reading events, deliver what clients already have queued,
+    # then release shared connections
+    await ws.bridge.stop()
+    await ws.manager.close_all()
+    await graph.aclose()
+    await redis.aclose(close_connection_pool=True)
+
+app = FastAPI(lifespan=lifespan)
+os.makedirs(MEDIA_DIR, exist_ok=True)
 
 origins = [
     "http://localhost",
@@ -33,10 +46,11 @@ app.add_middleware(
     allow_credentials=True,         # Allow cookies and credentials
     allow_methods=["*"],            # Allow all HTTP methods
     allow_headers=["*"],            # Allow all headers
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
-app.mount("/medias", StaticFiles(directory="medias"), name="medias")
+app.mount("/medias", medias.MediaFiles(directory=MEDIA_DIR), name="medias")
 
 app.include_router(auth.router)
 app.include_router(posts.router)
@@ -49,9 +63,6 @@ app.include_router(reactions.router)
 app.include_router(proxies.router)
 app.include_router(ws.router)
 
-@app.on_event('startup')
-async def startup():
-    asyncio.create_task(ws.post_manager.create_bridge())
 
 @app.get('/')
 async def home(name:str|None='mahi'):
@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from PIL import ExifTags, Image, ImageOps
+from sqlalchemy import select
+from .config import MEDIA_DIR
+from .db import get_session_sync
+from .models import Media, MediaType
+
+# Longest side of the dashboard thumbnails
+PREVIEW_SIZE = 320
+# Graph accepts larger photos but resizes them anyway; sending this size is
+# enough for full-screen display and keeps uploads small
+PUBLISH_MAX_SIDE = 2048
+PUBLISH_QUALITY = 85
+PREVIEW_QUALITY = 75
+# Formats Graph takes for photos without re-encoding
+PUBLISH_IMAGE_FORMATS = {"JPEG", "PNG"}
+PUBLISH_VIDEO_CODEC = "h264"
+
+def media_path(url: str) -> str:
+    """Local path of a file served under /medias/."""
+    return os.path.join(MEDIA_DIR, url.rsplit("/", 1)[-1])
+
+def variant_url(url: str, name: str) -> str:
+    return f"{url.rsplit('/', 1)[0]}/{name}"
+
+def write_atomic(name: str, write) -> str:
+    """Call ``write(path)`` on a temp file and move it to MEDIA_DIR/``name``.
+
+    Variants are named after the content hash, so one already on disk is
+    kept as is.
+    """
+    path = os.path.join(MEDIA_DIR, name)
+    if os.path.exists(path):
+        return name
+    fd, temp_path = tempfile.mkstemp(dir=MEDIA_DIR, suffix=os.path.splitext(name)[1])
+    os.close(fd)
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return name
+
+def process_image(media: Media, path: str) -> dict:
+    with Image.open(path) as image:
+        fields = {
+            "mime_type": Image.MIME.get(image.format),
+            "width": image.width,
+            "height": image.height,
+        }
+        if image.format == "GIF":
+            fields["type_of"] = MediaType.gif
+
+        rotated = image.getexif().get(ExifTags.Base.Orientation, 1) != 1
+        frame = ImageOps.exif_transpose(image) if rotated else image
+
+        preview = frame.convert("RGB") if frame.mode not in ("RGB", "L") else frame.copy()
+        preview.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
+        name = write_atomic(
+            f"{media.content_hash}_preview.jpg",
+            lambda target: preview.save(target, "JPEG", quality=PREVIEW_QUALITY, optimize=True)
+        )
+        fields["preview_url"] = variant_url(media.url, name)
+
+        needs_publish_variant = (
+            image.format not in PUBLISH_IMAGE_FORMATS
+            or max(image.size) > PUBLISH_MAX_SIDE
+            or rotated
+        )
+        # GIFs are published as they are so the animation survives
+        if image.format == "GIF" or not needs_publish_variant:
+            fields["publish_url"] = media.url
+        else:
+            publish = frame.copy()
+            publish.thumbnail((PUBLISH_MAX_SIDE, PUBLISH_MAX_SIDE))
+            if image.format == "PNG":
+                # Stays PNG so transparency survives
+                name = write_atomic(
+                    f"{media.content_hash}_publish.png",
+                    lambda target: publish.save(target, "PNG", optimize=True)
+                )
+            else:
+                if publish.mode not in ("RGB", "L"):
+                    publish = publish.convert("RGB")
+                name = write_atomic(
+                    f"{media.content_hash}_publish.jpg",
+                    lambda target: publish.save(target, "JPEG", quality=PUBLISH_QUALITY, optimize=True, progressive=True)
+                )
+            fields["publish_url"] = variant_url(media.url, name)
+            fields["width"], fields["height"] = publish.size
+    return fields
+
+def probe_video(path: str) -> dict:
+    """Read duration, codec and size of the first video stream with ffprobe."""
+    output = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=codec_name,width,height:format=duration",
+            "-of", "json", path,
+        ],
+        check=True, capture_output=True, text=True
+    ).stdout
+    data = json.loads(output)
+    stream = (data.get("streams") or [{}])[0]
+    duration = data.get("format", {}).get("duration")
+    return {
+        "codec": stream.get("codec_name"),
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "duration": float(duration) if duration else None,
+    }
+
+def process_video(media: Media, path: str) -> dict:
+    if not shutil.which("ffprobe") or not shutil.which("ffmpeg"):
+        print(f"ffmpeg not found, skipping video processing for media {media.id}")
+        return {"publish_url": media.url}
+
+    fields = probe_video(path)
+    name = write_atomic(
+        f"{media.content_hash}_preview.jpg",
+        lambda target: subprocess.run(
+            [
+                "ffmpeg", "-v", "error", "-y", "-ss", "1", "-i", path, "-frames:v", "1",
+                "-vf", f"scale='min({PREVIEW_SIZE},iw)':-2", "-f", "image2", target,
+            ],
+            check=True
+        )
+    )
+    fields["preview_url"] = variant_url(media.url, name)
+
+    if fields["codec"] == PUBLISH_VIDEO_CODEC and path.endswith(".mp4"):
+        fields["publish_url"] = media.url
+    else:
+        name = write_atomic(
+            f"{media.content_hash}_publish.mp4",
+            lambda target: subprocess.run(
+                [
+                    "ffmpeg", "-v", "error", "-y", "-i", path,
+                    "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+                    "-c:a", "aac", "-movflags", "+faststart", "-f", "mp4", target,
+                ],
+                check=True
+            )
+        )
+        fields["publish_url"] = variant_url(media.url, name)
+        fields["codec"] = PUBLISH_VIDEO_CODEC
+    return fields
+
+def process_medias(media_ids: list[int]) -> int:
+    """Build the preview and publish variants of the given medias and store their metadata.
+
+    Runs in a Celery worker. A media that fails keeps ``publish_url`` unset,
+    so publishing falls back to the original.
+    """
+    processed = 0
+    with get_session_sync() as session:
+        medias = session.execute(select(Media).where(Media.id.in_(media_ids))).scalars().all()
+        for media in medias:
+            path = media_path(media.url)
+            if not os.path.exists(path):
+                continue
+            try:
+                if media.type_of in (MediaType.image, MediaType.gif):
+                    fields = process_image(media, path)
+                elif media.type_of == MediaType.video:
+                    fields = process_video(media, path)
+                else:
+                    continue
+            except Exception as e:
+                print(f"Media processing failed for media {media.id}: {e}")
+                continue
+            fields["file_size"] = os.path.getsize(path)
+            for key, value in fields.items():
+                setattr(media, key, value)
+            processed += 1
+        session.commit()
+    return processed
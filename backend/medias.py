@@ -1,44 +1,140 @@
-from fastapi import FastAPI, File, UploadFile, APIRouter, Request, Depends
+from fastapi import FastAPI, File, UploadFile, APIRouter, Request, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
 from .db import get_session
 from sqlalchemy.ext.asyncio import AsyncSession
-import shutil
+import hashlib
 import os
+import re
+import tempfile
+from .config import settings, MEDIA_DIR
 from .models import Media, MediaType
+from .tasks import process_medias
 
-UPLOAD_DIR = "medias"
+UPLOAD_DIR = MEDIA_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+CHUNK_SIZE = 1024 * 1024
+
+# Uploads and their variants are named <sha256>[_variant].<ext>, so the
+# content behind such a name never changes
+HASHED_NAME = re.compile(r"^([0-9a-f]{64}(?:_\w+)?)\.\w+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "public, max-age=300"
+
 router = APIRouter(prefix='/upload',tags=["Medias"])
 
+class LinkCreate(BaseModel):
+    url: str
+
+class MediaFiles(StaticFiles):
+    """StaticFiles for content-addressed uploads.
+
+    Hashed names get a strong ETag from their hash and an immutable
+    Cache-Control, so browsers, CDNs and Graph fetches keep serving their
+    copy instead of asking again. Range requests (video seeking, resumed
+    downloads) are answered by FileResponse.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        match = HASHED_NAME.match(os.path.basename(full_path))
+        if match:
+            response.headers["etag"] = f'"{match.group(1)}"'
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["cache-control"] = DEFAULT_CACHE_CONTROL
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+def media_base_url(request: Request) -> str:
+    """Base of the public media URLs; set ``media_base_url`` when behind a proxy or CDN."""
+    if settings.media_base_url:
+        return settings.media_base_url.rstrip("/")
+    return f"{str(request.base_url).rstrip('/')}/medias"
+
+def media_type(content_type: str | None) -> MediaType:
+    content_type = content_type or ""
+    if content_type == "image/gif":
+        return MediaType.gif
+    if content_type.startswith("image/"):
+        return MediaType.image
+    if content_type.startswith("video/"):
+        return MediaType.video
+    raise HTTPException(status_code=415, detail=f"Unsupported media type: {content_type or 'unknown'}")
+
+def max_size(type_of: MediaType) -> int:
+    return settings.max_video_size if type_of == MediaType.video else settings.max_image_size
+
+def store_file(source, filename: str, max_size: int) -> tuple[str, str]:
+    """Stream ``source`` to UPLOAD_DIR under its SHA-256 and return (name, hash).
+
+    Identical content maps to the same file, which is only written once.
+    Stops with a 413 as soon as more than ``max_size`` bytes were read.
+    Runs in a worker thread, never on the event loop.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := source.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=f"{filename} is larger than {max_size // (1024 * 1024)} MB")
+                hasher.update(chunk)
+                buffer.write(chunk)
+        content_hash = hasher.hexdigest()
+        name = f"{content_hash}{os.path.splitext(filename or '')[1].lower()}"
+        path = os.path.join(UPLOAD_DIR, name)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+        return name, content_hash
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 @router.post("/")
 async def upload_media(request: Request, files: list[UploadFile] = File(...), session: AsyncSession = Depends(get_session)):
-    uploaded_files = []
+    base_url = media_base_url(request)
+    new_medias = []
 
     for file in files:
-        file_location = f"{UPLOAD_DIR}/{file.filename}"
-        if file.content_type.startswith("image/"):
-            type_of = MediaType.image
-        elif file.content_type.startswith("video/"):
-            type_of = MediaType.video
-        else:
-            type_of = "unknown"
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        base_url = str(request.base_url).rstrip("/")
-        media_url = f"{base_url}/medias/{file.filename}"
-        new_media = Media(url=media_url, type_of=type_of)
-        session.add(new_media)
-        await session.flush()
-        uploaded_files.append({
-            "id": new_media.id,
-            "filename": file.filename,
-            "url": media_url
-        })
-        
+        type_of = media_type(file.content_type)
+        name, content_hash = await run_in_threadpool(store_file, file.file, file.filename, max_size(type_of))
+        media_url = f"{base_url}/{name}"
+        new_medias.append((file.filename, Media(url=media_url, type_of=type_of, content_hash=content_hash, mime_type=file.content_type)))
+
+    # One flush for every row, then one commit
+    session.add_all([media for _, media in new_medias])
+    await session.flush()
+    uploaded_files = [
+        {"id": media.id, "filename": filename, "url": media.url}
+        for filename, media in new_medias
+    ]
+
     await session.commit()
+    # Previews, publish variants and metadata are built in the background
+    process_medias.delay([file["id"] for file in uploaded_files])
     return {"files": uploaded_files}
 
+@router.post("/link")
+async def create_link(data: LinkCreate, session: AsyncSession = Depends(get_session)):
+    if not data.url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="Link must be an http(s) URL")
+    media = Media(url=data.url, type_of=MediaType.link)
+    session.add(media)
+    await session.commit()
+    return {"id": media.id, "url": media.url, "type_of": media.type_of}
+
 @router.post("/check")
 async def check():
-    return "all ok"
\ No newline at end of file
+    return "all ok"
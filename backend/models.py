@@ -1,5 +1,6 @@
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from datetime import datetime, timedelta
 from enum import Enum
 
@@ -45,7 +46,7 @@ class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
     picture: Optional[str] = None
-    fb_id: str
+    fb_id: str = Field(index=True)
     email: str
     access_token: str
     expiry : datetime = Field(default_factory=default_expiry)
@@ -77,7 +78,7 @@ class Group(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name : str
     fbid : str
-    admin_id: Optional[int] = Field(default=None, foreign_key="user.id", ondelete="SET NULL")
+    admin_id: Optional[int] = Field(default=None, foreign_key="user.id", ondelete="SET NULL", index=True)
     admin: Optional[User] = Relationship(back_populates="groups")
     post_processes: List["PostProcess"] = Relationship(back_populates="groups",link_model=PostProcessGroupLink)
     
@@ -86,11 +87,16 @@ class Page(SQLModel, table=True):
     name : str
     fbid : str
     access_token : str
-    admin_id: Optional[int] = Field(default=None, foreign_key="user.id", ondelete="SET NULL")
+    admin_id: Optional[int] = Field(default=None, foreign_key="user.id", ondelete="SET NULL", index=True)
     admin: Optional[User] = Relationship(back_populates="pages")
     post_processes: List["PostProcess"] = Relationship(back_populates="pages",link_model=PostProcessPageLink)
 
 class PostProcess(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_postprocess_created_at_id", "created_at", "id"),
+        Index("ix_postprocess_status_created_at", "status", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     text: Optional[str] = None
     scheduled_for: Optional[datetime] = None
@@ -115,10 +121,25 @@ class PostProcess(SQLModel, table=True):
     proxy : Optional["Proxy"] = Relationship(back_populates="post_processes")
     
     created_at : datetime = Field(default_factory=datetime.utcnow)
+
+    total_count : int = 0
+    queued_count : int = 0
+    published_count : int = 0
+    error_count : int = 0
     
 class Post(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_post_status_scheduled_for", "status", "scheduled_for"),
+        Index("ix_post_created_at_id", "created_at", "id"),
+        Index("ix_post_status_created_at", "status", "created_at", "id"),
+        Index("ix_post_process_id_created_at", "process_id", "created_at", "id"),
+        Index("ix_post_process_id_status", "process_id", "status"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)  
     scheduled_for: Optional[datetime] = None
+    # Set when the scheduler claims the row (status Running)
+    claimed_at: Optional[datetime] = None
     target: PostTarget
     target_id: str
     fb_id: Optional[str] = None
@@ -140,7 +161,17 @@ class Media(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     url: str
     type_of : MediaType
-    process_id: Optional[int] = Field(default=None, foreign_key="postprocess.id", ondelete="SET NULL")
+    content_hash : str | None = Field(default=None, index=True)
+    # Filled in by the media pipeline
+    preview_url : str | None = None
+    publish_url : str | None = None
+    mime_type : str | None = None
+    file_size : int | None = None
+    width : int | None = None
+    height : int | None = None
+    duration : float | None = None
+    codec : str | None = None
+    process_id: Optional[int] = Field(default=None, foreign_key="postprocess.id", ondelete="SET NULL", index=True)
     post_id: Optional[int] = Field(default=None, foreign_key="post.id", ondelete="SET NULL")
     
     process: Optional[PostProcess] = Relationship(back_populates="medias")
@@ -150,6 +181,11 @@ class Media(SQLModel, table=True):
     published_at : datetime | None = None
     
 class CommentProcess(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_commentprocess_created_at_id", "created_at", "id"),
+        Index("ix_commentprocess_status_created_at", "status", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     scheduled_for: Optional[datetime] = None
     name : str
@@ -167,8 +203,22 @@ class CommentProcess(SQLModel, table=True):
     use_ai : bool = Field(default=False)
     post_id : str
     comments : List["Comment"] = Relationship(back_populates="process")
+
+    total_count : int = 0
+    queued_count : int = 0
+    published_count : int = 0
+    error_count : int = 0
     
 class Comment(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_comment_status_scheduled_for", "status", "scheduled_for"),
+        Index("ix_comment_created_at_id", "created_at", "id"),
+        Index("ix_comment_status_created_at", "status", "created_at", "id"),
+        Index("ix_comment_process_id_created_at", "process_id", "created_at", "id"),
+        Index("ix_comment_process_id_status", "process_id", "status"),
+        Index("ix_comment_user_id_status", "user_id", "status"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     text : str
     use_ai : bool = Field(default=False)
@@ -183,8 +233,15 @@ class Comment(SQLModel, table=True):
     user_id : Optional[int] = Field(default=None, foreign_key="user.id", ondelete='SET NULL')
     user : Optional[User] = Relationship(back_populates="comments")
     scheduled_for: Optional[datetime] = None
+    # Set when the scheduler claims the row (status Running)
+    claimed_at: Optional[datetime] = None
     
 class ReactionProcess(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_reactionprocess_created_at_id", "created_at", "id"),
+        Index("ix_reactionprocess_status_created_at", "status", "created_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     scheduled_for: Optional[datetime] = None
     name : str
@@ -202,8 +259,22 @@ class ReactionProcess(SQLModel, table=True):
     users: List["User"] = Relationship(back_populates="reaction_processes", link_model=ReactionProcessUserLink)
     
     reactions: List["Reaction"] = Relationship(back_populates="process")
+
+    total_count : int = 0
+    queued_count : int = 0
+    published_count : int = 0
+    error_count : int = 0
     
 class Reaction(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_reaction_status_scheduled_for", "status", "scheduled_for"),
+        Index("ix_reaction_created_at_id", "created_at", "id"),
+        Index("ix_reaction_status_created_at", "status", "created_at", "id"),
+        Index("ix_reaction_process_id_created_at", "process_id", "created_at", "id"),
+        Index("ix_reaction_process_id_status", "process_id", "status"),
+        Index("ix_reaction_user_id_status", "user_id", "status"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     type_of : ReactionType = ReactionType.like
     status : Status = Status.pending
@@ -216,6 +287,8 @@ class Reaction(SQLModel, table=True):
     process_id: Optional[int] = Field(default=None, foreign_key="reactionprocess.id", ondelete="SET NULL")
     process: Optional[ReactionProcess] = Relationship(back_populates="reactions")
     scheduled_for: Optional[datetime] = None
+    # Set when the scheduler claims the row (status Running)
+    claimed_at: Optional[datetime] = None
 
 class Proxy(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -0,0 +1,61 @@
+import base64
+from datetime import datetime
+from fastapi import HTTPException, Response
+from sqlalchemy import desc, tuple_
+from .models import Status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = f"{created_at.isoformat()}|{id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate(stmt, model, limit: int, cursor: str | None = None, page: int = 1):
+    """Order ``stmt`` newest first on (created_at, id) and select one page.
+
+    With a ``cursor`` the page is found through the (created_at, id) index,
+    so deep pages cost the same as the first one. ``page`` is only honoured
+    when no cursor is given, for clients that still paginate by offset.
+    One extra row is fetched so ``finish_page`` can tell if there is more.
+    """
+    stmt = stmt.order_by(desc(model.created_at), desc(model.id)).limit(limit + 1)
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        # Row-value comparison so the database can seek into the index
+        stmt = stmt.where(tuple_(model.created_at, model.id) < (created_at, id))
+    elif page > 1:
+        stmt = stmt.offset((page - 1) * limit)
+    return stmt
+
+def finish_page(rows: list, limit: int, response: Response) -> list:
+    """Trim the look-ahead row and expose the next cursor as a response header."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows
+
+def filter_rows(
+    stmt,
+    model,
+    status: Status | None = None,
+    process_id: int | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+):
+    if status is not None:
+        stmt = stmt.where(model.status == status)
+    if process_id is not None:
+        stmt = stmt.where(model.process_id == process_id)
+    if created_after is not None:
+        stmt = stmt.where(model.created_at >= created_after)
+    if created_before is not None:
+        stmt = stmt.where(model.created_at < created_before)
+    return stmt
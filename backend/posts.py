@@ -1,17 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import selectinload, load_only
 from .db import get_session
+from .pagination import paginate, finish_page, filter_rows
+from .progress import ProcessProgress, get_progress
 from .models import Post, PostProcess, Media,MediaType, Group, Page, PostProcessGroupLink, PostProcessPageLink, MediaType, PostTarget, Status
 from typing import List, Optional
 from sqlmodel import Session, select, delete, func, desc, or_
+from sqlalchemy import insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from datetime import datetime,timedelta
 import random
 from enum import Enum
 from .lib.ai import ai
-from .tasks import process_post, publish_post
-from .ws import manager, Action
+from .tasks import dispatch_post_batch
+from .fanout import fan_out_posts
+from .events import Action, emit_quietly, redis
 
 router = APIRouter(prefix="/posts", tags=["Posts"])
 
@@ -29,6 +33,10 @@ class MediaRead(BaseModel):
     id: int
     url: str
     type_of: MediaType
+    preview_url: str | None = None
+    width: int | None = None
+    height: int | None = None
+    duration: float | None = None
 
     class Config:
         orm_mode = True
@@ -110,6 +118,31 @@ class PostProcessCreate(BaseModel):
     groups: Optional[List[int]] = []
     pages: Optional[List[int]] = []
     
+async def with_targets(session: AsyncSession, posts: List[Post]) -> List[dict]:
+    """Serialize ``posts`` for PostRead with their group/page attached.
+
+    Targets are resolved with at most one IN query per target type.
+    """
+    target_ids = {PostTarget.group: set(), PostTarget.page: set()}
+    for post in posts:
+        target_ids[post.target].add(int(post.target_id))
+
+    targets = {}
+    for target, model in ((PostTarget.group, Group), (PostTarget.page, Page)):
+        if target_ids[target]:
+            result = await session.execute(select(model).where(model.id.in_(target_ids[target])))
+            for obj in result.scalars().all():
+                targets[(target, str(obj.id))] = obj
+
+    serialized = []
+    for post in posts:
+        post_dict = dict(post)
+        target = targets.get((post.target, post.target_id))
+        post_dict['group'] = target if post.target == PostTarget.group else None
+        post_dict['page'] = target if post.target == PostTarget.page else None
+        serialized.append(post_dict)
+    return serialized
+
 @router.get("/process/count")
 async def get_all_processes_count(session : AsyncSession = Depends(get_session)):
     result = await session.execute(select(func.count(PostProcess.id)))
@@ -125,20 +158,20 @@ async def delete_all_posts(session: AsyncSession = Depends(get_session)):
 
 @router.get("/", response_model=List[PostRead])
 async def list_posts(
+    response: Response,
     session: AsyncSession = Depends(get_session),
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
-    search: Optional[str] = Query(None)
+    cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header"),
+    search: Optional[str] = Query(None),
+    status: Optional[Status] = Query(None),
+    process_id: Optional[int] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
 ):
-    offset = (page - 1) * limit
-
-    stmt = (
-        select(Post)
-        .order_by(desc(Post.created_at))
-        .options(selectinload(Post.process))
-        .offset(offset)
-        .limit(limit)
-    )
+    stmt = select(Post).options(selectinload(Post.process))
+    stmt = filter_rows(stmt, Post, status, process_id, created_after, created_before)
+    stmt = paginate(stmt, Post, limit, cursor, page)
 
     if search:
         stmt = stmt.join(Post.process).where(
@@ -150,20 +183,9 @@ async def list_posts(
         )
 
     result = await session.execute(stmt)
-    posts = result.scalars().all()
+    posts = finish_page(result.scalars().all(), limit, response)
 
-    modified_posts = []
-    for post in posts:
-        post_dict = dict(post)
-        if post.target == PostTarget.group:
-            group = await session.get(Group, post.target_id)
-            post_dict['group'] = group
-        elif post.target == PostTarget.page:
-            page_obj = await session.get(Page, post.target_id)
-            post_dict['page'] = page_obj
-        modified_posts.append(post_dict)
-
-    return modified_posts
+    return await with_targets(session, posts)
 
 @router.get("/count")
 async def get_all_processes_count(session : AsyncSession = Depends(get_session)):
@@ -174,29 +196,29 @@ async def get_all_processes_count(session : AsyncSession = Depends(get_session))
 
 @router.get("/process", response_model=List[PostProcessRead])
 async def list_post_processes(
+    response: Response,
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
     limit: int = Query(10, ge=1, description="Number of items per page (must be greater than 0)"),
+    cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header"),
+    status: Optional[Status] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
     session: AsyncSession = Depends(get_session)):
-    offset = (page - 1) * limit
-    
-    result = await session.execute(
-        select(PostProcess)
-        .order_by(desc(PostProcess.created_at))
-        .options(
-            selectinload(PostProcess.medias),
-            selectinload(PostProcess.groups),
-            selectinload(PostProcess.pages),
-        )
-        .offset(offset)
-        .limit(limit)
+    stmt = select(PostProcess).options(
+        selectinload(PostProcess.medias),
+        selectinload(PostProcess.groups),
+        selectinload(PostProcess.pages),
     )
-    processes = result.scalars().all()
+    stmt = filter_rows(stmt, PostProcess, status, created_after=created_after, created_before=created_before)
+    result = await session.execute(paginate(stmt, PostProcess, limit, cursor, page))
+    processes = finish_page(result.scalars().all(), limit, response)
     
     return processes
 
 # Route to create a new post process and link medias, groups, and pages
 @router.post("/process", response_model=PostProcess)
-async def create_post_process(data: PostProcessCreate, session: AsyncSession = Depends(get_session)):
+async def create_post_process(
+    data: PostProcessCreate, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_session)):
     post_process = PostProcess(
         text=data.text,
         scheduled_for=data.scheduled_for,
@@ -210,142 +232,49 @@ async def create_post_process(data: PostProcessCreate, session: AsyncSession = D
     )
 
     session.add(post_process)
-    await session.commit()
-    await session.refresh(post_process)
-    
-    post_ids = []
+    await session.flush()
 
     # Link existing medias to this post process
     if data.medias:
-        result = await session.execute(select(Media).where(Media.id.in_(data.medias)))
-        medias = result.scalars().all()
-        for media in medias:
-            media.process_id = post_process.id
+        await session.execute(
+            update(Media).where(Media.id.in_(data.medias)).values(process_id=post_process.id)
+        )
 
     # Add groups to this post process
-    for group_id in data.groups or []:
-        link = PostProcessGroupLink(post_process_id=post_process.id, group_id=group_id)
-        session.add(link)
+    if data.groups:
+        await session.execute(
+            insert(PostProcessGroupLink),
+            [{"post_process_id": post_process.id, "group_id": group_id} for group_id in data.groups]
+        )
 
     # Add pages to this post process
-    for page_id in data.pages or []:
-        link = PostProcessPageLink(post_process_id=post_process.id, page_id=page_id)
-        session.add(link)
+    if data.pages:
+        await session.execute(
+            insert(PostProcessPageLink),
+            [{"post_process_id": post_process.id, "page_id": page_id} for page_id in data.pages]
+        )
 
+    # Create the posts in the same transaction, then commit everything once
+    created_posts = await fan_out_posts(session, post_process)
     await session.commit()
     await session.refresh(post_process)
 
-    # Create posts for each group and page with interval logic
-    previous_post_scheduled_for = post_process.scheduled_for
-    
-    result = await session.execute(
-        select(PostProcess)
-        .options(
-            selectinload(PostProcess.groups).selectinload(Group.admin),
-            selectinload(PostProcess.pages)
-        )
-        .where(PostProcess.id == post_process.id)
-    )
-    post_process = result.scalar_one()
-
-    # Creating posts for each group
-    for group_link in post_process.groups:
-        group = await session.get(Group, group_link.id)
-        text = post_process.text
-        # if post_process.use_ai:
-        #     response = await ai.post(
-        #         "/chat/completions",
-        #         json={
-        #             "model": post_process.ai_model,
-        #             "messages": [{"role": "user", "content": text}]
-        #         }
-        #     )
-        #     text = response.json()['choices'][0]['message']['content']
-        if group:
-            post = Post(
-                text=text,
-                scheduled_for=previous_post_scheduled_for,
-                target=PostTarget.group,  # PostTarget.group
-                target_id=str(group.id),
-                fb_id=group.fbid,
-                access_token=group.admin.access_token if group.admin else None,
-                process_id=post_process.id,
-                status=Status.queued
-            )
-            session.add(post)
-            await session.flush()
-            
-            await manager.broadcast({
-                "action": Action.post_create,
-                'data': post.model_dump()
-            })
-
-            post_ids.append({"id":post.id,"scheduled_for":post.scheduled_for})
-
-            # Schedule next post based on interval
-            if post_process.interval:
-                previous_post_scheduled_for = previous_post_scheduled_for + timedelta(minutes=post_process.interval)
-            elif post_process.interval_range_start and post_process.interval_range_end:
-                random_interval = random.randint(post_process.interval_range_start, post_process.interval_range_end)
-                previous_post_scheduled_for = previous_post_scheduled_for + timedelta(minutes=random_interval)
-
-    # Creating posts for each page
-    for page_link in post_process.pages:
-        page = await session.get(Page, page_link.id)
-        if page:
-            text = post_process.text
-            # if post_process.use_ai:
-            #     response = await ai.post(
-            #         "/chat/completions",
-            #         json={
-            #             "model": post_process.ai_model,
-            #             "messages": [{"role": "user", "content": text}]
-            #         }
-            #     )
-            #     text = response.json()['choices'][0]['message']['content']
-            post = Post(
-                text=text,
-                scheduled_for=previous_post_scheduled_for,
-                target=PostTarget.page,  # PostTarget.page
-                target_id=str(page.id),
-                fb_id=page.fbid,
-                access_token=page.access_token,
-                process_id=post_process.id,
-                status=Status.queued
-            )
-            session.add(post)
-            await session.flush()
-            
-            await manager.broadcast({
-                "action": Action.post_create,
-                'data': post.model_dump()
-            })
-
-            post_ids.append({"id":post.id,"scheduled_for":post.scheduled_for})
-
-            # Schedule next post based on interval
-            if post_process.interval:
-                previous_post_scheduled_for = previous_post_scheduled_for + timedelta(minutes=post_process.interval)
-            elif post_process.interval_range_start and post_process.interval_range_end:
-                random_interval = random.randint(post_process.interval_range_start, post_process.interval_range_end)
-                previous_post_scheduled_for = previous_post_scheduled_for + timedelta(minutes=random_interval)
-
-    # Commit the posts to the database
-    await session.commit()
-    await session.refresh(post_process)
-    
-    for post_id in post_ids:
-        process_post.delay(post_id['id'])
-        publish_post.apply_async(args=[post_id['id']], eta=post_id['scheduled_for'])
-        
-        
-    await manager.broadcast({
-        "action": Action.postprocess_create,
-        'data': post_process.model_dump()
-    })
+    if created_posts:
+        status = Status.pending if post_process.use_ai else Status.queued
+        background_tasks.add_task(emit_quietly, redis, Action.post_create, created_posts, process_id=post_process.id, status=status)
+
+    # process_posts only rewrites AI-enabled posts
+    if post_process.use_ai:
+        dispatch_post_batch([post["id"] for post in created_posts])
+
+    background_tasks.add_task(emit_quietly, redis, Action.postprocess_create, post_process.model_dump(), process_id=post_process.id, status=post_process.status)
 
     return post_process
     
+@router.get("/process/{process_id}/progress", response_model=ProcessProgress)
+async def get_post_process_progress(process_id: int, session: AsyncSession = Depends(get_session)):
+    return await get_progress(session, PostProcess, process_id)
+
 @router.get("/{post_id}", response_model=PostRead)
 async def get_post(post_id: int, details: bool = False,session : AsyncSession = Depends(get_session)):
     result = None
@@ -360,14 +289,7 @@ async def get_post(post_id: int, details: bool = False,session : AsyncSession =
         ) 
         post = result.scalar_one_or_none()
         if post:
-            post = dict(post)
-            if post['target'] == PostTarget.group:
-                group = await session.get(Group, post['target_id'])
-                post['group'] = group
-            elif post['target'] == PostTarget.page:
-                page_obj = await session.get(Page, post['target_id'])
-                post['page'] = page_obj
-            return post
+            return (await with_targets(session, [post]))[0]
         else:
             raise HTTPException(status_code=404, detail="Post not found")
     else:
@@ -0,0 +1,77 @@
+from collections import Counter
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import update, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Status
+
+# Process statuses that can still roll up to Success / Error
+ACTIVE_STATUSES = (Status.pending, Status.queued, Status.running)
+
+class ProcessProgress(BaseModel):
+    id: int
+    status: Status
+    total: int
+    queued: int
+    published: int
+    error: int
+
+def record_progress(session, process_model, process_ids: dict[int, int | None], updates: list[dict]):
+    """Apply finished child ``updates`` to their process counters and roll up.
+
+    ``process_ids`` maps child id -> process id. Runs inside the caller's
+    transaction; one UPDATE per touched process plus two rollup UPDATEs.
+    """
+    published, errors = Counter(), Counter()
+    for row_update in updates:
+        process_id = process_ids.get(row_update["id"])
+        if process_id is None:
+            continue
+        if row_update["status"] == Status.published:
+            published[process_id] += 1
+        elif row_update["status"] == Status.error:
+            errors[process_id] += 1
+
+    touched = set(published) | set(errors)
+    for process_id in touched:
+        session.execute(
+            update(process_model)
+            .where(process_model.id == process_id)
+            .values(
+                published_count=process_model.published_count + published[process_id],
+                error_count=process_model.error_count + errors[process_id],
+                queued_count=process_model.queued_count - published[process_id] - errors[process_id],
+            )
+        )
+
+    if touched:
+        finished = (
+            process_model.id.in_(touched),
+            process_model.queued_count <= 0,
+            process_model.status.in_(ACTIVE_STATUSES),
+        )
+        session.execute(update(process_model).where(*finished, process_model.error_count > 0).values(status=Status.error))
+        session.execute(update(process_model).where(*finished, process_model.error_count == 0).values(status=Status.success))
+
+async def get_progress(session: AsyncSession, process_model, process_id: int) -> ProcessProgress:
+    result = await session.execute(
+        select(
+            process_model.id,
+            process_model.status,
+            process_model.total_count,
+            process_model.queued_count,
+            process_model.published_count,
+            process_model.error_count,
+        ).where(process_model.id == process_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Process not found")
+    return ProcessProgress(
+        id=row.id,
+        status=row.status,
+        total=row.total_count,
+        queued=row.queued_count,
+        published=row.published_count,
+        error=row.error_count,
+    )
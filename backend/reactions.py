@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select, func
 from sqlalchemy.orm import selectinload
@@ -6,6 +6,9 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 from .models import ReactionProcess, Reaction, User, Status, ReactionType, ReactionProcessUserLink
 from .db import get_session
+from .pagination import paginate, finish_page, filter_rows
+from .progress import ProcessProgress, get_progress
+from .events import Action, emit_quietly, redis
 from pydantic import BaseModel
 import random
 
@@ -63,7 +66,8 @@ class ReactionRead(BaseModel):
 
 # Create a reaction process
 @router.post("/process", response_model=ReactionProcessRead)
-async def create_reaction_process(data: ReactionProcessCreate, session: AsyncSession = Depends(get_session)):
+async def create_reaction_process(
+    data: ReactionProcessCreate, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_session)):
     # Create the reaction process with type_of included
     reaction_process = ReactionProcess(
         name=data.name,
@@ -108,40 +112,50 @@ async def create_reaction_process(data: ReactionProcessCreate, session: AsyncSes
             random_minutes = random.randint(data.interval_range_start, data.interval_range_end)
             current_time = current_time + timedelta(minutes=random_minutes)
 
+    reaction_process.total_count = reaction_process.queued_count = len(users)
+
     await session.commit()
     await session.refresh(reaction_process)
+    background_tasks.add_task(emit_quietly, redis, Action.reactionprocess_create, reaction_process.model_dump(), process_id=reaction_process.id, status=reaction_process.status)
     return reaction_process
 
 @router.get("/process", response_model=List[ReactionProcessRead])
 async def list_reaction_processes(
+    response: Response,
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
     limit: int = Query(10, ge=1, description="Items per page (must be > 0)"),
+    cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header"),
+    status: Optional[Status] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
     session: AsyncSession = Depends(get_session)
 ):
-    offset = (page - 1) * limit
-    result = await session.execute(
-        select(ReactionProcess)
-        .offset(offset)
-        .options(selectinload(ReactionProcess.users))
-        .limit(limit)
-    )
-    return result.scalars().all()
+    stmt = select(ReactionProcess).options(selectinload(ReactionProcess.users))
+    stmt = filter_rows(stmt, ReactionProcess, status, created_after=created_after, created_before=created_before)
+    result = await session.execute(paginate(stmt, ReactionProcess, limit, cursor, page))
+    return finish_page(result.scalars().all(), limit, response)
 
 # List all reactions
 @router.get("/", response_model=List[ReactionRead])
 async def list_reactions(
+    response: Response,
     page: int = Query(1, ge=1, description="Page number (starts from 1)"),
     limit: int = Query(10, ge=1, description="Items per page (must be > 0)"),
+    cursor: Optional[str] = Query(None, description="Value of the previous page's X-Next-Cursor header"),
+    status: Optional[Status] = Query(None),
+    process_id: Optional[int] = Query(None),
+    created_after: Optional[datetime] = Query(None),
+    created_before: Optional[datetime] = Query(None),
     session: AsyncSession = Depends(get_session)
 ):
-    offset = (page - 1) * limit
-    result = await session.execute(
-        select(Reaction)
-        .options(selectinload(Reaction.user))
-        .offset(offset)
-        .limit(limit)
-    )
-    return result.scalars().all()
+    stmt = select(Reaction).options(selectinload(Reaction.user))
+    stmt = filter_rows(stmt, Reaction, status, process_id, created_after, created_before)
+    result = await session.execute(paginate(stmt, Reaction, limit, cursor, page))
+    return finish_page(result.scalars().all(), limit, response)
+
+@router.get("/process/{process_id}/progress", response_model=ProcessProgress)
+async def get_reaction_process_progress(process_id: int, session: AsyncSession = Depends(get_session)):
+    return await get_progress(session, ReactionProcess, process_id)
 
 @router.get("/process/count")
 async def get_all_processes_count(session : AsyncSession = Depends(get_session)):
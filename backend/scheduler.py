@@ -0,0 +1,183 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, or_
+from backend.db import get_session_celery
+from backend.models import Post, Comment, Reaction, Status
+from backend.tasks import celery_app, publish_posts, execute_comments, execute_reactions
+
+# How often the scheduler polls, and how far ahead it dispatches due rows
+SCHEDULER_INTERVAL = 30
+SCHEDULER_WINDOW = 60
+# Max rows claimed per table per tick
+SCHEDULER_BATCH_SIZE = 500
+# Rows handed to one publish_posts / execute_* task
+EXECUTE_BATCH_SIZE = 100
+# A claimed row not finished this long after its claim (on top of the
+# window it may wait for its ETA) is put back in line
+CLAIM_GRACE = 15 * 60
+
+class DispatchError(Exception):
+    """Sending to the broker failed; ``unsent_ids`` never reached it."""
+
+    def __init__(self, unsent_ids: list[int]):
+        self.unsent_ids = unsent_ids
+        super().__init__(f"{len(unsent_ids)} rows were not dispatched")
+
+def _dispatch_batches(task, rows):
+    """Send one ``task`` message per run of rows, timed for the earliest row."""
+    start = 0
+    try:
+        with celery_app.producer_or_acquire() as producer:
+            for start in range(0, len(rows), EXECUTE_BATCH_SIZE):
+                batch = rows[start:start + EXECUTE_BATCH_SIZE]
+                task.apply_async(
+                    args=[[row_id for row_id, _ in batch]],
+                    eta=batch[0][1],
+                    producer=producer
+                )
+    except Exception as e:
+        raise DispatchError([row_id for row_id, _ in rows[start:]]) from e
+
+def dispatch_posts_due(rows):
+    _dispatch_batches(publish_posts, rows)
+
+def dispatch_comments_due(rows):
+    _dispatch_batches(execute_comments, rows)
+
+def dispatch_reactions_due(rows):
+    _dispatch_batches(execute_reactions, rows)
+
+# model -> (status a row waits in until it is due, dispatcher for claimed rows)
+SCHEDULED_TABLES = {
+    Post: (Status.queued, dispatch_posts_due),
+    Comment: (Status.pending, dispatch_comments_due),
+    Reaction: (Status.pending, dispatch_reactions_due),
+}
+
+def claim_due(session, model, due_status: Status, horizon: datetime, limit: int = SCHEDULER_BATCH_SIZE):
+    """Mark due rows of ``model`` as Running and return their (id, scheduled_for).
+
+    The status guard on the UPDATE makes concurrent schedulers safe: a row
+    is only ever claimed once. ``claimed_at`` lets ``requeue_stale`` find
+    claims that never finished.
+    """
+    due_ids = session.execute(
+        select(model.id)
+        .where(
+            model.status == due_status,
+            or_(model.scheduled_for == None, model.scheduled_for <= horizon)
+        )
+        .order_by(model.scheduled_for)
+        .limit(limit)
+    ).scalars().all()
+
+    if not due_ids:
+        return []
+
+    result = session.execute(
+        update(model)
+        .where(model.id.in_(due_ids), model.status == due_status)
+        .values(status=Status.running, claimed_at=datetime.utcnow())
+        .returning(model.id, model.scheduled_for)
+    )
+    rows = result.all()
+    session.commit()
+    return rows
+
+def release_claim(session, model, due_status: Status, ids: list[int]):
+    """Put claimed rows back to ``due_status``, e.g. when their dispatch failed."""
+    session.execute(
+        update(model)
+        .where(model.id.in_(ids), model.status == Status.running)
+        .values(status=due_status, claimed_at=None)
+    )
+    session.commit()
+
+def requeue_stale(session, model, due_status: Status, window: int = SCHEDULER_WINDOW) -> int:
+    """Put back Running rows whose claim is older than the window plus CLAIM_GRACE.
+
+    Covers dispatches lost in the broker and workers that died before
+    writing a result; the database stays the source of truth.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=window + CLAIM_GRACE)
+    result = session.execute(
+        update(model)
+        .where(model.status == Status.running, model.claimed_at < cutoff)
+        .values(status=due_status, claimed_at=None)
+    )
+    session.commit()
+    return result.rowcount
+
+def queue_unrewritten(session, grace: int = CLAIM_GRACE) -> int:
+    """Queue AI posts still Pending ``grace`` seconds after they were created.
+
+    Covers process_posts messages lost in the broker: the posts go out with
+    their original text instead of waiting forever.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    result = session.execute(
+        update(Post)
+        .where(Post.status == Status.pending, Post.created_at < cutoff)
+        .values(status=Status.queued)
+    )
+    session.commit()
+    return result.rowcount
+
+def dispatch_due(window: int = SCHEDULER_WINDOW):
+    """Claim every row due within ``window`` seconds and hand it to its dispatcher.
+
+    Claims that could not be sent to the broker are released right away;
+    stale claims are requeued first so they are picked up in the same tick.
+    """
+    horizon = datetime.utcnow() + timedelta(seconds=window)
+    dispatched = {}
+    with get_session_celery() as session:
+        unrewritten = queue_unrewritten(session)
+        if unrewritten:
+            print(f"Scheduler queued {unrewritten} posts never rewritten by AI")
+        for model, (due_status, dispatcher) in SCHEDULED_TABLES.items():
+            requeued = requeue_stale(session, model, due_status, window)
+            if requeued:
+                print(f"Scheduler requeued {requeued} stale {model.__tablename__} claims")
+            count = 0
+            while True:
+                rows = claim_due(session, model, due_status, horizon)
+                if not rows:
+                    break
+                try:
+                    dispatcher(rows)
+                except DispatchError as e:
+                    # Rows already sent stay claimed; the others go back in line
+                    release_claim(session, model, due_status, e.unsent_ids)
+                    raise
+                count += len(rows)
+            dispatched[model.__tablename__] = count
+    return dispatched
+
+@celery_app.task
+def dispatch_due_task():
+    return dispatch_due()
+
+celery_app.conf.beat_schedule = {
+    **(celery_app.conf.beat_schedule or {}),
+    "dispatch-due": {
+        "task": dispatch_due_task.name,
+        "schedule": SCHEDULER_INTERVAL,
+    },
+}
+
+async def run_scheduler(interval: int = SCHEDULER_INTERVAL):
+    """Standalone alternative to celery beat."""
+    while True:
+        try:
+            dispatched = await asyncio.to_thread(dispatch_due)
+            print(f"Scheduler dispatched {dispatched}")
+        except Exception as e:
+            print(f"Scheduler tick failed: {e}")
+        await asyncio.sleep(interval)
+
+# Run this with either:
+# celery -A backend.celery_worker.celery_app beat --loglevel=info
+# python -m backend.scheduler
+if __name__ == "__main__":
+    asyncio.run(run_scheduler())
@@ -1,41 +1,36 @@
 import redis
-import requests
+import asyncio
+from collections import defaultdict
 from celery import Celery
-from backend.db import get_session_sync, get_session_celery
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
-from enum import Enum
+from celery.signals import worker_process_init
+from backend.config import settings
+from backend.db import get_session_celery, sync_engine
+from sqlalchemy import select, update
+from sqlalchemy.orm import contains_eager
 from backend.models import Post, Status, PostProcess
+from backend import engine
+from backend.lib.ai import ai_service
+from backend import media_pipeline
+from backend.events import Action, emit, status_delta
 
-r = redis.Redis()
+r = redis.Redis.from_url(settings.redis_url)
 
-class Action(str, Enum):
-    postprocess_create = "postprocess.create"
-    post_create = "post.create"
-    post_update = "post.update"
 
 celery_app = Celery(
     "worker",
-    broker="redis://localhost:6379/0",
-    backend="redis://localhost:6379/0"
+    broker=settings.redis_url,
+    backend=settings.redis_url,
+    include=["backend.scheduler"]
 )
 
-def get_ai_response(text: str, model: str):
-    headers = {
-        "Content-Type": "application/json",
-        "accept": "application/json",
-        "Ocp-Apim-Subscription-Key": "sk-SvASnX-rljk7nCKqjiwurg"
-    }
-    response = requests.post(
-        "https://ai.worthmind.net/chat/completions",
-        headers=headers,
-        json={
-            "model": model,
-            "messages": [{"role": "user", "content": text}]
-        }
-    )
-    response.raise_for_status()  # Optional: raises an error on bad response
-    return response.json()['choices'][0]['message']['content']
+@worker_process_init.connect
+def reset_db_pool(**kwargs):
+    # Forked workers must not reuse connections opened by the parent
+    sync_engine.dispose(close=False)
+
+# Number of post ids handed to one dispatch_posts / process_posts task
+DISPATCH_CHUNK_SIZE = 200
+PROCESS_CHUNK_SIZE = 20
 
 @celery_app.task
 def add(x, y):
@@ -43,42 +38,130 @@ def add(x, y):
 
 @celery_app.task
 def publish_post(post_id):
-    print(f"\n===========\nSceduling {post_id}\n==========\n")
-    with get_session_celery() as session:
-        post = session.get(Post, post_id)
-        if post:
-            post.status = Status.published
-            session.commit()
-            print(f"\n===========\nScedule done {post_id}\n==========\n")
-            r.publish(Action.post_update, post_id)
+    # Kept for messages enqueued before the scheduler; posts the scheduler
+    # has not claimed are skipped, so these never publish on their own
+    return publish_posts([post_id])
+
+@celery_app.task
+def publish_posts(post_ids):
+    updates = engine.execute_posts(post_ids)
+    if updates:
+        # One event per task; the API's bridge merges and forwards them
+        emit(r, Action.post_update, [status_delta(update) for update in updates])
+    return len(updates)
 
 @celery_app.task
 def process_post(post_id):
-    print(f"\n==========\nProcessing Post {post_id}\n============\n")
+    return process_posts([post_id])
+
+@celery_app.task
+def process_posts(post_ids):
+    """Rewrite the text of AI-enabled posts, one variants call per process.
+
+    Only Pending posts are rewritten; each one is then Queued for the
+    scheduler, with its original text when the AI call failed. The write
+    is guarded on Pending so a post already queued (or published) is
+    never overwritten.
+    """
     with get_session_celery() as session:
-        post = (
-            session.query(Post)
+        posts = session.execute(
+            select(Post)
+            .join(Post.process)
             .options(
-                joinedload(Post.process).load_only(
+                contains_eager(Post.process).load_only(
                     PostProcess.id, PostProcess.text, PostProcess.use_ai, PostProcess.ai_model
                 )
             )
-            .filter(Post.id == post_id)
-            .first()
-        )
-        
-        if post and post.process:
-            if post.process.use_ai:
-                try:
-                    text = get_ai_response(post.text, post.process.ai_model)
-
-                    post.text = text
-                    
-
-                except Exception as e:
-                    print(f"AI call or update failed: {e}")
-                
-            # post.status = Status.queued
-            session.commit()
-
-            
+            .where(Post.id.in_(post_ids), Post.status == Status.pending, PostProcess.use_ai == True)
+        ).scalars().all()
+        if not posts:
+            return 0
+        session.expunge_all()
+
+        by_process = defaultdict(list)
+        for post in posts:
+            by_process[post.process_id].append(post)
+
+        texts = engine.run_async(rewrite_groups(list(by_process.values())))
+        updates = []
+        for group, group_texts in zip(by_process.values(), texts):
+            for post, text in zip(group, group_texts):
+                if isinstance(text, Exception):
+                    print(f"AI call failed for post {post.id}: {text}")
+                    text = post.text
+                updates.append({"id": post.id, "text": text, "status": Status.queued})
+
+        queued = set(session.execute(
+            update(Post)
+            .where(Post.id.in_([row["id"] for row in updates]), Post.status == Status.pending)
+            .values(status=Status.queued)
+            .returning(Post.id)
+        ).scalars().all())
+        updates = [row for row in updates if row["id"] in queued]
+        if updates:
+            session.execute(update(Post), [{"id": row["id"], "text": row["text"]} for row in updates])
+        session.commit()
+
+    if updates:
+        process_ids = {post.id: post.process_id for post in posts}
+        emit(r, Action.post_update, [
+            status_delta({**row, "process_id": process_ids[row["id"]]}) for row in updates
+        ])
+    return len(updates)
+
+async def rewrite_groups(groups):
+    # Gathered inside the worker loop, not the thread's default loop
+    return await asyncio.gather(*(rewrite_posts(group) for group in groups))
+
+async def rewrite_posts(posts):
+    """Return one rewritten text (or exception) per post of a single process.
+
+    Asks for all variants in one completion and only falls back to per-post
+    completions for the ones the model did not deliver. Prompts use the
+    process text and seeds come from post ids, so retries hit the cache.
+    """
+    process = posts[0].process
+    base_text = process.text or posts[0].text
+    try:
+        variants = await ai_service.variants(base_text, process.ai_model, len(posts), seed=posts[0].id)
+    except Exception as e:
+        print(f"AI variants call failed for process {process.id}: {e}")
+        variants = []
+
+    missing = posts[len(variants):]
+    fallback = await ai_service.complete_many([(base_text, process.ai_model, post.id) for post in missing])
+    return variants + fallback
+
+@celery_app.task
+def execute_comments(comment_ids):
+    updates = engine.execute_comments(comment_ids)
+    if updates:
+        emit(r, Action.comment_update, [status_delta(update) for update in updates])
+    return len(updates)
+
+@celery_app.task
+def execute_reactions(reaction_ids):
+    updates = engine.execute_reactions(reaction_ids)
+    if updates:
+        emit(r, Action.reaction_update, [status_delta(update) for update in updates])
+    return len(updates)
+
+@celery_app.task
+def process_medias(media_ids):
+    return media_pipeline.process_medias(media_ids)
+
+@celery_app.task
+def dispatch_posts(post_ids):
+    """Enqueue process_posts for a batch of posts from the worker side.
+
+    Publishing is not enqueued here: backend.scheduler dispatches publish_post
+    from the database once each post is due.
+    """
+    with celery_app.producer_or_acquire() as producer:
+        for start in range(0, len(post_ids), PROCESS_CHUNK_SIZE):
+            process_posts.apply_async(args=[post_ids[start:start + PROCESS_CHUNK_SIZE]], producer=producer)
+
+def dispatch_post_batch(post_ids):
+    """Send one dispatch_posts message per DISPATCH_CHUNK_SIZE posts."""
+    for start in range(0, len(post_ids), DISPATCH_CHUNK_SIZE):
+        dispatch_posts.delay(post_ids[start:start + DISPATCH_CHUNK_SIZE])
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from .models import User, Reaction, Comment
 from typing import List, Optional
 from .db import get_session
@@ -65,30 +65,39 @@ class UserRead(BaseModel):
 
 @router.get("/", response_model=List[UserRead])
 async def get_users_with_counts(db: AsyncSession = Depends(get_session)) -> List[UserRead]:
-    # Query to fetch users with related groups and pages
-    query = select(User).options(
-        selectinload(User.groups),
-        selectinload(User.pages),
+    # Reaction and comment counts per user, computed once for all users
+    reaction_counts = (
+        select(Reaction.user_id, func.count(Reaction.id).label("count"))
+        .group_by(Reaction.user_id)
+        .subquery()
+    )
+    comment_counts = (
+        select(Comment.user_id, func.count(Comment.id).label("count"))
+        .group_by(Comment.user_id)
+        .subquery()
     )
 
-    # Execute the query asynchronously
-    result = await db.execute(query)
-    users = result.scalars().all()
-
-    # Prepare the response with counts of reactions and comments
-    user_read_list = []
-    for user in users:
-        # Count reactions and comments for each user using async queries
-        reaction_count = await db.execute(
-            select(func.count(Reaction.id)).filter(Reaction.user_id == user.id)
+    # One query for users and counts, plus one selectin query each for groups and pages
+    query = (
+        select(
+            User,
+            func.coalesce(reaction_counts.c.count, 0),
+            func.coalesce(comment_counts.c.count, 0),
         )
-        reaction_count = reaction_count.scalar()
-
-        comment_count = await db.execute(
-            select(func.count(Comment.id)).filter(Comment.user_id == user.id)
+        .outerjoin(reaction_counts, reaction_counts.c.user_id == User.id)
+        .outerjoin(comment_counts, comment_counts.c.user_id == User.id)
+        .options(
+            selectinload(User.groups),
+            selectinload(User.pages),
         )
-        comment_count = comment_count.scalar()
+        .order_by(User.id)
+    )
+
+    result = await db.execute(query)
 
+    user_read_list = []
+    for user, reaction_count, comment_count in result.all():
+        # The user is the admin of their own groups and pages
         user_read = UserRead(
             id=user.id,
             name=user.name,
@@ -102,8 +111,8 @@ async def get_users_with_counts(db: AsyncSession = Depends(get_session)) -> List
             page_count=len(user.pages),
             total_reactions=reaction_count,
             total_comments=comment_count,
-            groups=[GroupRead(id=group.id, name=group.name, fbid=group.fbid, admin_id=group.admin_id, admin_name=group.admin.name) for group in user.groups],
-            pages=[PageRead(id=page.id, name=page.name, fbid=page.fbid, access_token=page.access_token, admin_id=page.admin_id, admin_name=page.admin.name) for page in user.pages],
+            groups=[GroupRead(id=group.id, name=group.name, fbid=group.fbid, admin_id=group.admin_id, admin_name=user.name) for group in user.groups],
+            pages=[PageRead(id=page.id, name=page.name, fbid=page.fbid, access_token=page.access_token, admin_id=page.admin_id, admin_name=user.name) for page in user.pages],
         )
         user_read_list.append(user_read)
 
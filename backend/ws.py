@@ -1,73 +1,467 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import json
-from enum import Enum
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Response
+from pydantic import BaseModel, ValidationError
+import os
+import random
+import socket
+import time
+import itertools
+from collections import OrderedDict, defaultdict, deque
 from datetime import datetime
-from redis.asyncio import Redis
+from redis.exceptions import ResponseError
 import asyncio
-from datetime import datetime
-from typing import Any
-from fastapi import WebSocket
-import copy
-from .db import get_session_sync
+from typing import Any, Hashable
+from .events import (
+    EVENTS_STREAM, UPDATE_ACTIONS, _value, encode, decode_fields, strip_secrets, stream_id, redis
+)
 
 router = APIRouter()
-redis = Redis()
 
-class Action(str, Enum):
-    postprocess_create = "postprocess.create"
-    post_create = "post.create"
-    post_update = "post.update"
+# Messages buffered per client; past this the oldest ones are dropped and
+# the client is told to resync
+SEND_QUEUE_SIZE = 256
+# A client that takes longer than this to accept one message is dropped
+SEND_TIMEOUT = 10
+# Topic value matching every event kind / process
+ANY = "*"
+# Row updates from workers are merged for this long (seconds) before one
+# frame per action, process and status goes out
+BRIDGE_WINDOW = 0.15
+# Stream entries read per call
+READ_COUNT = 500
+READ_BLOCK = 5000  # ms
+# Reconnect delays of the bridge after Redis errors (seconds, jittered)
+BRIDGE_BACKOFF = 1.0
+BRIDGE_MAX_BACKOFF = 30.0
+# Consumer groups of API processes that stopped reading this long ago are
+# removed at startup (ms)
+STALE_GROUP_IDLE = 60 * 60 * 1000
+# How long shutdown waits for clients to receive their queued messages
+DRAIN_TIMEOUT = 5.0
+# Entries replayed to one client at most; kept under SEND_QUEUE_SIZE so a
+# replay never drops its own oldest messages
+REPLAY_LIMIT = 200
+
+class Subscription(BaseModel):
+    """What a client wants to receive; a missing filter matches everything.
+
+    Sent over the socket as ``{"action": "subscribe", "events": [...],
+    "process_ids": [...], "statuses": [...]}``.
+    """
+    events: set[str] | None = None
+    process_ids: set[int] | None = None
+    statuses: set[str] | None = None
+
+    def matches(self, action: str, process_id: int | None = None, status: str | None = None) -> bool:
+        return (
+            (self.events is None or action in self.events)
+            and (self.process_ids is None or process_id in self.process_ids)
+            and (self.statuses is None or status is None or status in self.statuses)
+        )
+
+    def topics(self) -> list[tuple[str, Any]]:
+        events = self.events if self.events is not None else {ANY}
+        process_ids = self.process_ids if self.process_ids is not None else {ANY}
+        return [("event", event) for event in events] + [("process", process_id) for process_id in process_ids]
+
+RESYNC_KEY = "resync"
+RESYNC_FRAME = encode({"action": "resync"})
+
+class Client:
+    """One socket with its own bounded send queue.
+
+    Messages sent with the same ``key`` while an earlier one is still queued
+    replace it in place. When the queue is full the oldest message is
+    dropped and a single ``resync`` message is (re)queued last, so a slow
+    client reloads instead of keeping the stale state it missed.
+    """
+
+    _ids = itertools.count()
+
+    def __init__(self, websocket: WebSocket, queue_size: int = SEND_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.pending: OrderedDict[Hashable, str] = OrderedDict()
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.writer: asyncio.Task | None = None
+        self.subscription = Subscription()
+        # Live frames held back while a replay is running, and the stream
+        # position the replay reached; live frames at or below it are
+        # duplicates of replayed ones
+        self.held: list[tuple[str, str | None]] | None = None
+        self.replayed_to: tuple[int, int] | None = None
+        # Ids of the latest live frames, so a replay skips what was already sent
+        self.sent_ids: deque[str] = deque(maxlen=queue_size)
+
+    def send(self, text: str, event_id: str | None = None):
+        if self.held is not None:
+            self.held.append((text, event_id))
+            return
+        if event_id is not None:
+            if self.replayed_to is not None and stream_id(event_id) <= self.replayed_to:
+                return
+            self.sent_ids.append(event_id)
+        self.enqueue(text)
+
+    def hold(self):
+        self.held = []
+
+    def release(self, replayed_to: tuple[int, int] | None):
+        held, self.held = self.held or [], None
+        self.replayed_to = replayed_to
+        for text, event_id in held:
+            self.send(text, event_id)
+
+    def enqueue(self, text: str, key: Hashable | None = None):
+        if key is None:
+            key = next(self._ids)
+        elif key in self.pending:
+            self.pending[key] = text
+            return
+        if len(self.pending) >= self.queue_size:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+            # After what was dropped, whatever else is queued
+            self.pending.pop(RESYNC_KEY, None)
+            self.pending[key] = text
+            self.pending[RESYNC_KEY] = RESYNC_FRAME
+        else:
+            self.pending[key] = text
+        self.ready.set()
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            while self.pending:
+                _, text = self.pending.popitem(last=False)
+                await asyncio.wait_for(self.websocket.send_text(text), SEND_TIMEOUT)
+            self.ready.clear()
 
 # Connection Manager
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    """Fans messages out to clients without waiting on any socket.
+
+    Each message is encoded once and queued on every matching client; one
+    writer task per client does the actual sends, and clients whose sends
+    fail or time out are evicted. ``topics`` indexes clients by the event
+    kinds and process ids they subscribed to, so ``publish`` only looks at
+    interested clients.
+    """
+
+    def __init__(self, queue_size: int = SEND_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.clients: dict[WebSocket, Client] = {}
+        self.topics: dict[tuple[str, Any], set[Client]] = defaultdict(set)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = Client(websocket, self.queue_size)
+        client.writer = asyncio.create_task(self._write(client))
+        self.clients[websocket] = client
+        self._index(client)
         print("New Connection")
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        await websocket.send_json(self._serialize_datetimes(message))
-
-    async def broadcast(self, message: dict):
-        serialized = self._serialize_datetimes(message)
-        for connection in self.active_connections:
-            await connection.send_json(serialized)
-
-    def _serialize_datetimes(self, obj: Any) -> Any:
-        if isinstance(obj, dict):
-            return {k: self._serialize_datetimes(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._serialize_datetimes(i) for i in obj]
-        elif isinstance(obj, datetime):
-            return obj.isoformat()
-        return obj
-    
-
-class PostManager:
-    def __init__(self,manager: ConnectionManager):
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return
+        self._unindex(client)
+        if client.writer is not None:
+            client.writer.cancel()
+
+    def subscribe(self, websocket: WebSocket, subscription: Subscription):
+        """Replace the client's subscription."""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        self._unindex(client)
+        client.subscription = subscription
+        self._index(client)
+
+    def send_personal_message(self, message: dict, websocket: WebSocket):
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue(encode(message))
+
+    def publish(
+        self,
+        action: str,
+        data: Any,
+        process_id: int | None = None,
+        status: str | None = None,
+        event_id: str | None = None,
+    ):
+        """Queue an ``action`` event for the clients subscribed to it and return immediately."""
+        # Enum members hash by name, so match topics on their plain values
+        action, status = _value(action), _value(status)
+        by_event = self.topics.get(("event", action), set()) | self.topics.get(("event", ANY), set())
+        if process_id is None:
+            by_process = self.topics.get(("process", ANY), set())
+        else:
+            by_process = self.topics.get(("process", process_id), set()) | self.topics.get(("process", ANY), set())
+        clients = by_event & by_process
+        if status is not None:
+            clients = [
+                client for client in clients
+                if client.subscription.statuses is None or status in client.subscription.statuses
+            ]
+        if not clients:
+            return
+
+        text = encode(self.frame(action, data, event_id))
+        for client in clients:
+            client.send(text, event_id)
+
+    def frame(self, action: str, data: Any, event_id: str | None = None) -> dict:
+        message = {"action": action, "data": strip_secrets(data)}
+        if event_id is not None:
+            message["event_id"] = event_id
+        return message
+
+    async def replay(self, websocket: WebSocket, last_event_id: str):
+        """Send the client the retained events after ``last_event_id`` that match its subscription.
+
+        Live frames are held back until the replay is done and the ones it
+        already covered are dropped, so every event arrives once and in
+        order. If events it missed were already trimmed from the stream (or
+        there are more than REPLAY_LIMIT), a ``resync`` message tells it to
+        reload.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        try:
+            after = stream_id(last_event_id)
+        except ValueError:
+            client.enqueue(RESYNC_FRAME, RESYNC_KEY)
+            return
+
+        client.hold()
+        replayed_to = after
+        try:
+            # Once the client's last event is gone, what followed it may be gone too
+            oldest = await redis.xrange(EVENTS_STREAM, count=1)
+            if oldest and stream_id(oldest[0][0].decode()) > after:
+                client.enqueue(RESYNC_FRAME, RESYNC_KEY)
+                return
+
+            entries = await redis.xrange(EVENTS_STREAM, min=f"({last_event_id}", count=REPLAY_LIMIT)
+            subscription = client.subscription
+            already_sent = set(client.sent_ids)
+            for event_id, fields in entries:
+                event_id = event_id.decode()
+                replayed_to = stream_id(event_id)
+                if event_id in already_sent:
+                    continue
+                action, data, process_id, status = decode_fields(fields)
+                if action in UPDATE_ACTIONS:
+                    data = [
+                        delta for delta in data
+                        if subscription.matches(action, delta.get("process_id"), delta.get("status"))
+                    ]
+                    if data:
+                        client.enqueue(encode(self.frame(action, data, event_id)))
+                elif subscription.matches(action, process_id, status):
+                    client.enqueue(encode(self.frame(action, data, event_id)))
+            if len(entries) >= REPLAY_LIMIT:
+                client.enqueue(RESYNC_FRAME, RESYNC_KEY)
+        finally:
+            client.release(replayed_to)
+
+    async def close_all(self, timeout: float = DRAIN_TIMEOUT):
+        """Give clients up to ``timeout`` seconds to receive what is queued, then close them."""
+        deadline = time.monotonic() + timeout
+        while any(client.pending for client in self.clients.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for websocket, client in list(self.clients.items()):
+            self.disconnect(websocket)
+            try:
+                # 1001: going away, so clients reconnect and resume
+                await websocket.close(code=1001)
+            except Exception:
+                pass
+
+    def _index(self, client: Client):
+        for topic in client.subscription.topics():
+            self.topics[topic].add(client)
+
+    def _unindex(self, client: Client):
+        for topic in client.subscription.topics():
+            clients = self.topics.get(topic)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.topics[topic]
+
+    async def _write(self, client: Client):
+        try:
+            await client.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dropping websocket client: {e!r}")
+            if self.clients.pop(client.websocket, None) is not None:
+                self._unindex(client)
+            try:
+                await client.websocket.close()
+            except Exception:
+                pass
+
+
+class EventBridge:
+    """Reads the events stream once per API process and fans events out locally.
+
+    Each process has its own consumer group on the stream, so every process
+    sees every event, and entries are only acknowledged once handed to the
+    clients; after a reconnect the bridge first re-reads what it had not
+    acknowledged. Row updates (id, status, fb_id, published_at, ...) read
+    within BRIDGE_WINDOW are merged per row and sent as one frame per
+    (action, process, status) whose ``data`` is the list of deltas; every
+    other event is forwarded as it comes. Frames carry the stream id of the
+    latest entry they include, which clients send back to resume.
+    """
+
+    def __init__(self, manager: ConnectionManager, window: float = BRIDGE_WINDOW):
         self.manager = manager
-        
-    async def create_bridge(self):
-        pubsub = redis.pubsub()
-        await pubsub.subscribe(Action.post_update)
-
-        async for message in pubsub.listen():
-            if message["type"] == "message":
-                await self.manager.broadcast({
-                    "action":Action.post_update,
-                    "data": {"id":message['data'].decode()}
-                })
-    
+        self.window = window
+        self.group = f"api:{socket.gethostname()}:{os.getpid()}"
+        self.consumer = "bridge"
+        self.pending: dict[tuple[str, Any], dict] = {}
+        self.pending_event_id: str | None = None
+        self._tasks: list[asyncio.Task] = []
+        # Health
+        self.connected = False
+        self.restarts = 0
+        self.last_error: str | None = None
+        self.last_event_at: datetime | None = None
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self.supervise()),
+            asyncio.create_task(self._flush_periodically()),
+        ]
+
+    async def stop(self):
+        """Stop reading, hand out merged updates and drop this process's consumer group."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.connected = False
+        self.flush()
+        try:
+            await redis.xgroup_destroy(EVENTS_STREAM, self.group)
+        except Exception as e:
+            print(f"Could not remove consumer group {self.group}: {e!r}")
+
+    async def supervise(self):
+        """Keep ``run`` going, reconnecting with jittered exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Start the backoff over if the bridge had been working
+                attempt = 0 if self.connected else attempt + 1
+                self.connected = False
+                self.restarts += 1
+                self.last_error = repr(e)
+                delay = random.uniform(0, min(BRIDGE_MAX_BACKOFF, BRIDGE_BACKOFF * 2 ** attempt))
+                print(f"Event bridge failed ({e!r}), reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def health(self) -> dict:
+        return {
+            "connected": self.connected,
+            "group": self.group,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "last_event_at": self.last_event_at,
+            "pending_updates": len(self.pending),
+            "clients": len(self.manager.clients),
+        }
+
+    async def run(self):
+        try:
+            await redis.xgroup_create(EVENTS_STREAM, self.group, id="$", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        await self.prune_groups()
+        self.connected = True
+
+        # Unacknowledged entries first, then new ones
+        stream_position = "0"
+        while True:
+            response = await redis.xreadgroup(
+                self.group, self.consumer, {EVENTS_STREAM: stream_position},
+                count=READ_COUNT, block=READ_BLOCK
+            )
+            entries = [entry for _, stream_entries in response or [] for entry in stream_entries]
+            if not entries and stream_position == "0":
+                stream_position = ">"
+                continue
+            for event_id, fields in entries:
+                self.handle(event_id.decode(), fields)
+            if entries:
+                self.last_event_at = datetime.utcnow()
+                await redis.xack(EVENTS_STREAM, self.group, *[event_id for event_id, _ in entries])
+
+    async def prune_groups(self):
+        """Remove the consumer groups left behind by API processes that died without stopping."""
+        for group in await redis.xinfo_groups(EVENTS_STREAM):
+            name = group["name"].decode() if isinstance(group["name"], bytes) else group["name"]
+            if name == self.group or not name.startswith("api:"):
+                continue
+            consumers = await redis.xinfo_consumers(EVENTS_STREAM, name)
+            # A group with no consumer yet may belong to a process that is just starting
+            if consumers and all(consumer["idle"] > STALE_GROUP_IDLE for consumer in consumers):
+                await redis.xgroup_destroy(EVENTS_STREAM, name)
+
+    def handle(self, event_id: str, fields: dict):
+        action, data, process_id, status = decode_fields(fields)
+        if action not in UPDATE_ACTIONS:
+            # Merged updates carry an older id; send them first so the ids
+            # a client sees never go backwards
+            self.flush()
+            self.manager.publish(action, data, process_id=process_id, status=status, event_id=event_id)
+            return
+        for delta in data:
+            key = (action, delta["id"])
+            self.pending[key] = {**self.pending.get(key, {}), **delta}
+        self.pending_event_id = event_id
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        event_id, self.pending_event_id = self.pending_event_id, None
+        frames = defaultdict(list)
+        for (action, _), delta in pending.items():
+            frames[(action, delta.get("process_id"), delta.get("status"))].append(delta)
+        for (action, process_id, status), deltas in frames.items():
+            self.manager.publish(action, deltas, process_id=process_id, status=status, event_id=event_id)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.window)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Could not flush row updates: {e!r}")
+
 manager = ConnectionManager()
-post_manager = PostManager(manager)
+bridge = EventBridge(manager)
+
+@router.get("/ws/health")
+async def realtime_health(response: Response):
+    health = bridge.health()
+    if not health["connected"]:
+        response.status_code = 503
+    return health
 
 # WebSocket Endpoint
 @router.websocket("/ws")
@@ -76,8 +470,19 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         while True:
             data = await websocket.receive_json()  # Receive JSON
-            # await manager.send_personal_message({"message": f"You sent: {data}"}, websocket)
-            # await manager.broadcast({"broadcast": f"Broadcast: {data}"})
+            if not isinstance(data, dict):
+                continue
+            if data.get("action") == "subscribe":
+                try:
+                    subscription = Subscription.model_validate(data)
+                except ValidationError as e:
+                    manager.send_personal_message({"action": "error", "data": e.errors(include_url=False)}, websocket)
+                    continue
+                manager.subscribe(websocket, subscription)
+                manager.send_personal_message({"action": "subscribed", "data": subscription.model_dump()}, websocket)
+                if data.get("last_event_id"):
+                    await manager.replay(websocket, str(data["last_event_id"]))
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
-        # await manager.broadcast({"message": "A user disconnected."})
\ No newline at end of file
@@ -23,11 +23,11 @@ export const PostProcessesProvider = ({ children }: { children: ReactNode }) =>
 
   useWS((event) => {
     const payload: { action: Action, [key: string]: any } = JSON.parse(event.data)
-    if (payload.action === Action.PostProcessCreate) {
+    if (payload.action === Action.PostProcessCreate || payload.action === Action.Resync) {
       // console.log("Fetching new process")
       fetchPage(1, state.limit, false)
     }
-  })
+  }, { events: [Action.PostProcessCreate] })
 
   const fetchPage = async (page: number, limit = state.limit, cache: boolean = true) => {
     if (cache && state.cache[page] && limit === state.limit) {
@@ -33,42 +33,37 @@ export const PostsProvider = ({ children }: { children: ReactNode }) => {
     const payload: { action: Action, [key: string]: any } = JSON.parse(event.data)
     console.log("Ws recieved", payload)
     if (payload.action === Action.PostCreate) {
-      fetchPost(parseInt(`${ payload.data.id }`), true)
+      addPosts(Array.isArray(payload.data) ? payload.data : [payload.data])
     } else if (payload.action === Action.PostUpdate) {
-      fetchPost(parseInt(`${ payload.data.id }`))
+      applyUpdates(Array.isArray(payload.data) ? payload.data : [payload.data])
+    } else if (payload.action === Action.Resync) {
+      fetchPage(state.currentPage, state.limit, false)
     }
-  })
+  }, { events: [Action.PostCreate, Action.PostUpdate] })
+
+  // Prepend the rows carried by a post.create event, skipping ones already shown
+  const addPosts = (posts: Post[]) => {
+    setState((prev) => {
+      const shown = new Set(prev.data.map((post) => post.id))
+      const added = posts.filter((post) => !shown.has(post.id))
+      return added.length ? { ...prev, data: [...added.reverse(), ...prev.data] } : prev
+    })
+  }
 
-  const fetchPost = async (post_id: number, add: boolean = false) => {
-    try {
-      const res = await api.get(`/posts/${ post_id }?details=true`)
-      if (res.status === 200) {
-        if (add) {
-          console.log("adding", res.data)
-          setState((prev) => {
-            return {
-              ...prev,
-              data: [res.data, ...prev.data]
-            }
-          })
-          console.log("added", res.data)
-        } else {
-          setState((prev) => {
-            return {
-              ...prev,
-              data: prev.data.map((post) => {
-                if (post.id === res.data.id) {
-                  return res.data
-                }
-                return post
-              })
-            }
-          })
-        }
-      }
-    } catch (e) {
-      console.log("Error while fetch post")
-    }
+  // Patch posts in place from the status deltas sent by the server
+  const applyUpdates = (deltas: Partial<Post>[]) => {
+    const byId = new Map(deltas.map((delta) => [delta.id, delta]))
+    const patch = (posts: Post[]) => posts.map((post) => {
+      const delta = byId.get(post.id)
+      return delta ? { ...post, ...delta } : post
+    })
+    setState((prev) => ({
+      ...prev,
+      data: patch(prev.data),
+      cache: Object.fromEntries(
+        Object.entries(prev.cache).map(([page, posts]) => [page, patch(posts)])
+      ),
+    }))
   }
 
   const fetchPage = async (page: number, limit = state.limit, cache: boolean = true) => {
@@ -5,19 +5,54 @@ const WS_URL = "ws://localhost:8000/ws"; // replace with your fixed WebSocket UR
 export enum Action {
     PostProcessCreate = "postprocess.create",
     PostCreate = "post.create",
-    PostUpdate = "post.update"
+    PostUpdate = "post.update",
+    CommentProcessCreate = "commentprocess.create",
+    CommentUpdate = "comment.update",
+    ReactionProcessCreate = "reactionprocess.create",
+    ReactionUpdate = "reaction.update",
+    // Events were missed and can't be replayed; reload from the API
+    Resync = "resync"
 }
 
-export function useWS(onMessage: (event: MessageEvent) => void) {
+// Filters applied by the server; a missing field matches everything
+export interface Subscription {
+    events?: Action[]
+    process_ids?: number[]
+    statuses?: string[]
+}
+
+export function useWS(onMessage: (event: MessageEvent) => void, subscription?: Subscription) {
     const wsRef = useRef<WebSocket | null>(null);
+    // Last event seen, sent back on reconnect to replay what was missed
+    const lastEventIdRef = useRef<string | null>(null);
+    const subscriptionKey = JSON.stringify(subscription ?? null)
 
     useEffect(() => {
         try{
             const ws = new WebSocket(WS_URL);
             wsRef.current = ws;
-    
+
+            const onOpen = () => {
+                if (subscription || lastEventIdRef.current) {
+                    ws.send(JSON.stringify({
+                        action: "subscribe",
+                        ...subscription,
+                        last_event_id: lastEventIdRef.current
+                    }))
+                }
+            }
+            const trackEventId = (event: MessageEvent) => {
+                const { event_id } = JSON.parse(event.data)
+                if (event_id) {
+                    lastEventIdRef.current = event_id
+                }
+            }
+            ws.addEventListener("open", onOpen);
+            ws.addEventListener("message", trackEventId);
             ws.addEventListener("message", onMessage);
             return () => {
+                ws.removeEventListener("open", onOpen);
+                ws.removeEventListener("message", trackEventId);
                 ws.removeEventListener("message", onMessage);
                 ws.close();
             };
@@ -25,5 +60,5 @@ export function useWS(onMessage: (event: MessageEvent) => void) {
             console.log(e)
         }
 
-    }, [onMessage]);
+    }, [onMessage, subscriptionKey]);
 }
\ No newline at end of file